@@ -0,0 +1,34 @@
+import queue
+import threading
+
+
+class BackgroundTask:
+    def __init__(self):
+        self.__messages = queue.Queue()
+        self.__cancelled = threading.Event()
+        self.__thread = None
+
+    def start_thread(self, *args):
+        self.cancel()
+        self.__messages = queue.Queue()
+        self.__cancelled = threading.Event()
+        self.__thread = threading.Thread(target=self.run, args=args + (self.__messages, self.__cancelled), daemon=True)
+        self.__thread.start()
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def is_running(self):
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def has_messages(self):
+        return not self.__messages.empty()
+
+    def get_messages(self, limit=20):
+        messages = []
+        while len(messages) < limit:
+            try:
+                messages.append(self.__messages.get_nowait())
+            except queue.Empty:
+                break
+        return messages
@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+from decoding import DecodePool, SoundCache
+from pcm_cache import PcmDiskCache
+from metadata import MetadataIndex
+from player_core import PlayerCore
+from scanner import LibraryScanner
+from tracing import configure_tracing, tracer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TEMPLATE_COUNT = 8
+TRACK_SECONDS = 4
+FILES_PER_FOLDER = 100
+MP3_FRAME = b"\xff\xfb\x94\xc0" + bytes(380)
+MP3_FRAME_SAMPLES = 1152
+TIMEOUT = 30.0
+GAPLESS_LEAD_SECONDS = 1.0
+
+
+def write_wave_template(path, seed):
+    generator = np.random.default_rng(seed)
+    frames = 48000 * TRACK_SECONDS
+    tone = np.sin(2 * np.pi * (110 + 55 * seed) * np.arange(frames) / 48000) * 8000
+    samples = (tone + generator.normal(0, 500, frames)).astype("<i2")
+    with wave.open(path, "wb") as file:
+        file.setnchannels(2)
+        file.setsampwidth(2)
+        file.setframerate(48000)
+        file.writeframes(np.repeat(samples, 2).tobytes())
+
+
+def write_mp3_template(path, seed):
+    with open(path, "wb") as file:
+        file.write(MP3_FRAME * (48000 * TRACK_SECONDS // MP3_FRAME_SAMPLES + seed))
+
+
+def link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def generate_library(directory, size, extension):
+    template_dir = os.path.join(directory, "templates")
+    library_dir = os.path.join(directory, "library")
+    os.makedirs(template_dir, exist_ok=True)
+
+    templates = []
+    for seed in range(TEMPLATE_COUNT):
+        template = os.path.join(template_dir, f"template_{seed}{extension}")
+        if extension == ".wav":
+            write_wave_template(template, seed)
+        else:
+            write_mp3_template(template, seed)
+        templates.append(template)
+
+    for index in range(size):
+        folder = os.path.join(library_dir, f"album_{index // FILES_PER_FOLDER:05d}")
+        if index % FILES_PER_FOLDER == 0:
+            os.makedirs(folder, exist_ok=True)
+        link_or_copy(templates[index % TEMPLATE_COUNT], os.path.join(folder, f"track_{index:06d}{extension}"))
+    return library_dir
+
+
+def load_library(metadata, directory):
+    scanner = LibraryScanner(metadata)
+    files = []
+    started = time.perf_counter()
+    listed = None
+    scanner.start(directory)
+    while True:
+        for kind, value in scanner.get_messages(limit=1000):
+            if kind == "files":
+                files.extend(value)
+            elif kind == "listed":
+                listed = time.perf_counter() - started
+        if not scanner.is_running() and not scanner.has_messages():
+            break
+        time.sleep(0.001)
+    return files, {"listed_s": listed, "done_s": time.perf_counter() - started}
+
+
+def wait_until_playing(core, playing):
+    deadline = time.perf_counter() + TIMEOUT
+    while playing is None:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("track did not start")
+        time.sleep(0.0005)
+        playing = core.poll_pending()
+    while not playing.get_busy():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("channel did not become busy")
+        time.sleep(0.0005)
+    return playing
+
+
+def time_play(core, file):
+    started = time.perf_counter()
+    wait_until_playing(core, core.play_file(file))
+    return time.perf_counter() - started
+
+
+def time_seek(core, position):
+    started = time.perf_counter()
+    deadline = started + TIMEOUT
+    playing = core.seek(position)
+    while playing is None:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("seek did not complete")
+        time.sleep(0.0005)
+        if not core.is_seek_pending():
+            playing = core.seek(position)
+    wait_until_playing(core, playing)
+    return time.perf_counter() - started
+
+
+def measure_gapless(core, decode_pool, count, position):
+    recorded = len(core.get_gap_timings())
+    for _ in range(count):
+        wait_until_playing(core, core.play_file(core.get_current_file(), position))
+        next_file = core.get_next_track()[1]
+        decode_pool.request(core.get_file_path(next_file)).result()
+
+        deadline = time.perf_counter() + TIMEOUT
+        while core.commit_started_transition() is None:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("gapless transition did not start")
+            core.schedule_next_transition()
+            time.sleep(0.001)
+    return core.get_gap_timings()[recorded:]
+
+
+def summarize(samples):
+    samples_ms = [sample * 1000 for sample in samples]
+    return {"count": len(samples_ms),
+            "median_ms": statistics.median(samples_ms),
+            "max_ms": max(samples_ms),
+            "min_ms": min(samples_ms)}
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {"self_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            "children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+
+def init_case_process(trace_path):
+    configure_tracing(trace_path)
+    pygame.mixer.pre_init(48000, -16, 2, 2048)
+    pygame.mixer.init()
+
+
+def get_case_trace_path(trace_path, size, extension):
+    if not trace_path:
+        return None
+    root, suffix = os.path.splitext(trace_path)
+    return f"{root}_{size}_{extension[1:]}{suffix or '.json'}"
+
+
+def run_case(work_dir, size, extension, iterations, transitions, streaming, pcm_cache_mb):
+    library_dir = generate_library(work_dir, size, extension)
+    metadata = MetadataIndex(os.path.join(work_dir, "library.db"))
+    background = ThreadPoolExecutor(max_workers=1)
+    pcm_cache = PcmDiskCache(pcm_cache_mb * 1024 * 1024, os.path.join(work_dir, "pcm_cache")) if pcm_cache_mb > 0 else None
+    decode_pool = DecodePool(SoundCache(256 * 1024 * 1024), disk_cache=pcm_cache)
+    try:
+        files, cold_load = load_library(metadata, library_dir)
+        _, warm_load = load_library(metadata, library_dir)
+
+        metadata.put_listing(library_dir, files)
+        started = time.perf_counter()
+        restored = metadata.get_listing(library_dir)
+        listing_restore = time.perf_counter() - started
+
+        core = PlayerCore(metadata, decode_pool, background, streaming=streaming)
+        core.set_library(library_dir, files)
+        core.get_play_state()["paused"] = False
+
+        core.select_index(0)
+        first_audio = time_play(core, files[0])
+
+        switches = []
+        for _ in range(iterations):
+            switches.append(time_play(core, core.move_to_next()))
+
+        generator = random.Random(size)
+        seeks = [time_seek(core, generator.uniform(0, TRACK_SECONDS * 0.9)) for _ in range(iterations)]
+        gaps = measure_gapless(core, decode_pool, transitions, TRACK_SECONDS - GAPLESS_LEAD_SECONDS)
+        queued_gaps = measure_gapless(core, decode_pool, transitions, 0.0)
+        core.close()
+
+        result = {"library_size": size,
+                  "format": extension.lstrip("."),
+                  "streaming": streaming,
+                  "pcm_cache_mb": pcm_cache_mb,
+                  "files_found": len(files),
+                  "directory_load_cold": cold_load,
+                  "directory_load_warm": warm_load,
+                  "listing_restore_ms": listing_restore * 1000,
+                  "listing_restored_files": len(restored),
+                  "time_to_first_audio_ms": first_audio * 1000,
+                  "next_track_switch": summarize(switches),
+                  "seek": summarize(seeks),
+                  "gapless_gap": summarize(gaps) if gaps else None,
+                  "queued_gapless_gap": summarize(queued_gaps) if queued_gaps else None,
+                  "peak_rss": get_peak_rss_mb()}
+        if tracer.is_enabled():
+            result["spans"] = tracer.get_summary()
+            tracer.write_trace()
+        return result
+    finally:
+        decode_pool.shutdown()
+        background.shutdown(wait=True)
+        metadata.close()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark library loading and playback latency without a display.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated library sizes")
+    parser.add_argument("--formats", default="wav,mp3", help="comma separated formats (wav, mp3)")
+    parser.add_argument("--iterations", type=int, default=20, help="track switches and seeks per case")
+    parser.add_argument("--transitions", type=int, default=5, help="gapless track transitions measured per case")
+    parser.add_argument("--streaming", action="store_true", help="use the streaming playback mode")
+    parser.add_argument("--pcm-cache-mb", type=int, default=0, help="enable the decoded PCM disk cache with this budget")
+    parser.add_argument("--work-dir", help="directory for the generated libraries (default: a temporary directory)")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--trace", help="also write a Chrome trace of the instrumented spans per case, named after this file")
+    options = parser.parse_args(arguments)
+
+    results = []
+    for size in [int(size) for size in options.sizes.split(",")]:
+        for extension in [f".{name.strip().lower()}" for name in options.formats.split(",")]:
+            work_dir = tempfile.mkdtemp(prefix=f"bench_{size}_{extension[1:]}_", dir=options.work_dir)
+            try:
+                print(f"Running {size} {extension[1:]} tracks...", file=sys.stderr)
+                trace_path = get_case_trace_path(options.trace, size, extension)
+                with ProcessPoolExecutor(max_workers=1, initializer=init_case_process, initargs=(trace_path,)) as executor:
+                    results.append(executor.submit(run_case, work_dir, size, extension, options.iterations, options.transitions,
+                                                   options.streaming, options.pcm_cache_mb).result())
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"schema": 2,
+              "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "pygame": pygame.version.ver,
+              "cpu_count": os.cpu_count(),
+              "results": results}
+
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import pygame
+from tracing import tracer
+
+
+def get_sound_size(sound):
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency * channels * (abs(size) // 8))
+
+
+def init_decode_process(frequency=48000, size=-16, channels=2):
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    pygame.mixer.init(frequency, size, channels)
+
+
+class SoundPcmReader:
+    def __init__(self, sound, start=0.0):
+        frequency, size, channels = pygame.mixer.get_init()
+        self.__frame_size = abs(size) // 8 * channels
+        self.__samples = memoryview(sound).cast("B")
+        self.__offset = min(int(start * frequency) * self.__frame_size,
+                            len(self.__samples) - len(self.__samples) % self.__frame_size)
+
+    def read(self, frames):
+        data = self.__samples[self.__offset:self.__offset + frames * self.__frame_size]
+        self.__offset += len(data)
+        return bytes(data)
+
+    def close(self):
+        self.__samples.release()
+
+
+class SoundCache:
+    def __init__(self, max_bytes):
+        self.__max_bytes = max_bytes
+        self.__sounds = OrderedDict()
+        self.__total_bytes = 0
+        self.__lock = threading.Lock()
+
+    def __contains__(self, path):
+        with self.__lock:
+            return path in self.__sounds
+
+    def get(self, path):
+        with self.__lock:
+            if path not in self.__sounds:
+                return None
+            self.__sounds.move_to_end(path)
+            return self.__sounds[path][0]
+
+    def put(self, path, sound):
+        size = get_sound_size(sound)
+        with self.__lock:
+            if path in self.__sounds:
+                self.__total_bytes -= self.__sounds.pop(path)[1]
+            self.__sounds[path] = (sound, size)
+            self.__total_bytes += size
+
+            while self.__total_bytes > self.__max_bytes and len(self.__sounds) > 1:
+                _, (_, evicted_size) = self.__sounds.popitem(last=False)
+                self.__total_bytes -= evicted_size
+
+    def discard(self, path):
+        with self.__lock:
+            if path in self.__sounds:
+                self.__total_bytes -= self.__sounds.pop(path)[1]
+
+    def clear(self):
+        with self.__lock:
+            self.__sounds.clear()
+            self.__total_bytes = 0
+
+
+class DecodePool:
+    def __init__(self, cache, max_workers=2, disk_cache=None):
+        self.__cache = cache
+        self.__disk_cache = disk_cache
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="decode")
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+    def request(self, path):
+        sound = self.__cache.get(path)
+        if sound is not None:
+            future = Future()
+            future.set_result(sound)
+            return future
+
+        with self.__lock:
+            future = self.__pending.get(path)
+            if future is None:
+                future = self.__executor.submit(self.decode, path)
+                self.__pending[path] = future
+            return future
+
+    def get_cached(self, path):
+        return self.__cache.get(path)
+
+    def open_cached_reader(self, path, start=0.0):
+        if self.__disk_cache is None:
+            return None
+        return self.__disk_cache.open_reader(path, start)
+
+    def discard(self, path, previous_stat=None):
+        self.__cache.discard(path)
+        if self.__disk_cache is not None and previous_stat is not None:
+            self.__disk_cache.discard(path, previous_stat)
+
+    def is_disk_cached(self, path):
+        return self.__disk_cache is not None and self.__disk_cache.contains(path)
+
+    def prefetch(self, path):
+        if path not in self.__cache and not self.is_disk_cached(path):
+            self.request(path)
+
+    def decode(self, path):
+        try:
+            sound = self.__disk_cache.load_sound(path) if self.__disk_cache is not None else None
+            if sound is None:
+                with tracer.span("decode", path=path):
+                    sound = pygame.mixer.Sound(path)
+                if self.__disk_cache is not None:
+                    self.__executor.submit(self.__disk_cache.put, path, sound)
+            self.__cache.put(path, sound)
+            return sound
+        finally:
+            with self.__lock:
+                self.__pending.pop(path, None)
+
+    def shutdown(self):
+        self.__executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,47 @@
+import os
+import shutil
+import subprocess
+
+EDITOR_COMMAND = "audacity"
+
+
+def get_file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def find_editor(command=EDITOR_COMMAND):
+    return shutil.which(command)
+
+
+class EditSession:
+    def __init__(self, editor, path):
+        self.__path = path
+        self.__stat = os.stat(path)
+        self.__pending_signature = None
+        self.__process = subprocess.Popen([editor, path], stdin=subprocess.DEVNULL,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def is_running(self):
+        return self.__process.poll() is None
+
+    def has_pending_change(self):
+        return self.__pending_signature is not None
+
+    def poll_change(self):
+        signature = get_file_signature(self.__path)
+        if signature is None or signature == (self.__stat.st_size, self.__stat.st_mtime_ns):
+            self.__pending_signature = None
+            return None
+
+        if signature != self.__pending_signature:
+            self.__pending_signature = signature
+            return None
+
+        previous_stat = self.__stat
+        self.__stat = os.stat(self.__path)
+        self.__pending_signature = None
+        return previous_stat
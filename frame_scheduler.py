@@ -0,0 +1,87 @@
+import time
+from tracing import tracer
+
+FRAME_RATE = 60
+COALESCE_SLACK = 0.02
+
+
+class FrameScheduler:
+    def __init__(self, root, frame_rate=FRAME_RATE, slack=COALESCE_SLACK):
+        self.__root = root
+        self.__frame_interval = 1 / frame_rate
+        self.__slack = slack
+        self.__timers = {}
+        self.__animations = {}
+        self.__after_id = None
+        self.__wake_time = None
+
+    def call_later(self, key, delay_ms, callback, *args):
+        self.__timers[key] = (time.perf_counter() + delay_ms / 1000, callback, args)
+        self.wake()
+
+    def animate(self, key, callback):
+        self.__animations[key] = callback
+        self.wake()
+
+    def cancel(self, key):
+        self.__timers.pop(key, None)
+        self.__animations.pop(key, None)
+
+    def get_next_due(self):
+        due_times = [due for due, _, _ in self.__timers.values()]
+        if self.__animations:
+            due_times.append(time.perf_counter() + self.__frame_interval)
+        return min(due_times) if due_times else None
+
+    def wake(self):
+        due = self.get_next_due()
+        if due is None:
+            return
+        if self.__after_id is not None:
+            if self.__wake_time <= due + self.__slack:
+                return
+            self.__root.after_cancel(self.__after_id)
+
+        delay = max(1, int((due - time.perf_counter()) * 1000))
+        self.__wake_time = due
+        self.__after_id = self.__root.after(delay, self.tick)
+
+    def tick(self):
+        tracer.add_value("tk.lag", max(0.0, time.perf_counter() - self.__wake_time))
+        self.__after_id = None
+        self.__wake_time = None
+        try:
+            self.run_timers()
+            self.run_animations()
+        finally:
+            self.wake()
+
+    def run_timers(self):
+        deadline = time.perf_counter() + self.__slack
+        for key in [key for key, (due, _, _) in self.__timers.items() if due <= deadline]:
+            timer = self.__timers.get(key)
+            if timer is None or timer[0] > deadline:
+                continue
+            del self.__timers[key]
+            with tracer.span(f"ui.{key}"):
+                timer[1](*timer[2])
+
+    def run_animations(self):
+        if self.__animations:
+            with tracer.span("ui.animations", count=len(self.__animations)):
+                self.step_animations()
+
+    def step_animations(self):
+        now = time.perf_counter()
+        for key, callback in list(self.__animations.items()):
+            if self.__animations.get(key) is not callback:
+                continue
+            if not callback(now) and self.__animations.get(key) is callback:
+                del self.__animations[key]
+
+    def stop(self):
+        if self.__after_id is not None:
+            self.__root.after_cancel(self.__after_id)
+            self.__after_id = None
+        self.__timers.clear()
+        self.__animations.clear()
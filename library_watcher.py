@@ -0,0 +1,290 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from collections import namedtuple
+from background_task import BackgroundTask
+from scanner import is_supported_file
+
+LibraryChanges = namedtuple("LibraryChanges", ["added", "removed", "renamed", "changed"])
+
+POLL_INTERVAL = 2.0
+DEBOUNCE_SECONDS = 1.0
+INOTIFY_TIMEOUT = 0.25
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+INOTIFY_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def scan_directory(path):
+    files = {}
+    subdirectories = set()
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.add(entry.name)
+                elif is_supported_file(entry.name):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            except OSError:
+                continue
+    return files, subdirectories
+
+
+def match_renames(added, removed, changed):
+    removed_by_key = {}
+    for path, key in removed:
+        removed_by_key.setdefault(key, []).append(path)
+
+    renamed = []
+    added_paths = []
+    for path, key in added:
+        candidates = removed_by_key.get(key)
+        if candidates:
+            renamed.append((candidates.pop(), path))
+        else:
+            added_paths.append(path)
+
+    removed_paths = [path for paths in removed_by_key.values() for path in paths]
+    return LibraryChanges(added_paths, removed_paths, renamed, changed)
+
+
+class InotifyWatch:
+    def __init__(self):
+        self.__libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.__fd = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.__paths = {}
+        self.__descriptors = {}
+
+    def add(self, path):
+        descriptor = self.__libc.inotify_add_watch(self.__fd, os.fsencode(path), INOTIFY_MASK)
+        if descriptor < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(error, os.strerror(error), path)
+        self.__paths[descriptor] = path
+        self.__descriptors[path] = descriptor
+
+    def discard(self, path):
+        descriptor = self.__descriptors.pop(path, None)
+        if descriptor is not None and self.__paths.get(descriptor) == path:
+            del self.__paths[descriptor]
+
+    def read(self, timeout):
+        readable, _, _ = select.select([self.__fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.__fd, 65536)
+        except BlockingIOError:
+            return set()
+
+        directories = set()
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_IGNORED:
+                path = self.__paths.pop(descriptor, None)
+                if path is not None and self.__descriptors.get(path) == descriptor:
+                    del self.__descriptors[path]
+                continue
+
+            path = self.__paths.get(descriptor)
+            if path is not None:
+                directories.add(path)
+        return directories
+
+    def close(self):
+        os.close(self.__fd)
+
+
+def open_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return InotifyWatch()
+    except (OSError, AttributeError):
+        return None
+
+
+class LibrarySnapshot:
+    def __init__(self, root, watch=None):
+        self.__root = root
+        self.__watch = watch
+        self.__directories = {}
+        self.__polled_mtimes = {}
+
+    def get_directories(self):
+        return set(self.__directories)
+
+    def build(self):
+        added = []
+        self.add_tree(self.__root, added)
+        return [path for path, _ in added]
+
+    def add_tree(self, path, added):
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            if self.__watch is not None:
+                self.__watch.add(current)
+            try:
+                mtime = os.stat(current).st_mtime_ns
+                files, subdirectories = scan_directory(current)
+            except OSError:
+                continue
+
+            self.__directories[current] = (mtime, files, subdirectories)
+            added.extend((os.path.join(current, name), key) for name, key in files.items())
+            stack.extend(os.path.join(current, name) for name in subdirectories)
+
+    def remove_tree(self, path, removed):
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            record = self.__directories.pop(current, None)
+            self.__polled_mtimes.pop(current, None)
+            if record is None:
+                continue
+            if self.__watch is not None:
+                self.__watch.discard(current)
+
+            _, files, subdirectories = record
+            removed.extend((os.path.join(current, name), key) for name, key in files.items())
+            stack.extend(os.path.join(current, name) for name in subdirectories)
+
+    def get_changed_directories(self):
+        changed = set()
+        for path, (mtime, _, _) in self.__directories.items():
+            try:
+                current_mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                current_mtime = None
+            if current_mtime != self.__polled_mtimes.get(path, mtime):
+                self.__polled_mtimes[path] = current_mtime
+                changed.add(path)
+        return changed
+
+    def rescan(self, directories):
+        added, removed, changed = [], [], []
+        removed_trees, added_trees = [], []
+
+        for path in directories:
+            record = self.__directories.get(path)
+            if record is None:
+                continue
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                files, subdirectories = scan_directory(path)
+            except OSError:
+                removed_trees.append(path)
+                continue
+
+            _, old_files, old_subdirectories = record
+            for name, key in files.items():
+                old_key = old_files.get(name)
+                if old_key is None:
+                    added.append((os.path.join(path, name), key))
+                elif old_key[:2] != key[:2]:
+                    changed.append(os.path.join(path, name))
+            removed.extend((os.path.join(path, name), key) for name, key in old_files.items() if name not in files)
+
+            removed_trees.extend(os.path.join(path, name) for name in old_subdirectories - subdirectories)
+            added_trees.extend(os.path.join(path, name) for name in subdirectories - old_subdirectories)
+            self.__directories[path] = (mtime, files, subdirectories)
+
+        for path in removed_trees:
+            self.remove_tree(path, removed)
+        for path in added_trees:
+            self.add_tree(path, added)
+        return match_renames(added, removed, changed)
+
+
+class LibraryWatcher(BackgroundTask):
+    def __init__(self, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE_SECONDS):
+        super().__init__()
+        self.__poll_interval = poll_interval
+        self.__debounce = debounce
+
+    def start(self, directory, known_files, watch=True):
+        self.start_thread(directory, set(known_files), watch)
+
+    def open_snapshot(self, directory, watching):
+        watch = open_inotify() if watching else None
+        if watch is not None:
+            snapshot = LibrarySnapshot(directory, watch)
+            try:
+                return snapshot, watch, snapshot.build()
+            except OSError:
+                watch.close()
+
+        snapshot = LibrarySnapshot(directory)
+        return snapshot, None, snapshot.build()
+
+    def run(self, directory, known_files, watching, messages, cancelled):
+        snapshot, watch, paths = self.open_snapshot(directory, watching)
+        try:
+            found_files = {os.path.relpath(path, directory) for path in paths}
+            initial = LibraryChanges(sorted(found_files - known_files, key=str.lower), sorted(known_files - found_files), [], [])
+            if initial.added or initial.removed:
+                messages.put(("changes", initial))
+            if watching:
+                self.watch(directory, snapshot, watch, messages, cancelled)
+        finally:
+            if watch is not None:
+                watch.close()
+
+    def watch(self, directory, snapshot, watch, messages, cancelled):
+        dirty = set()
+        recent = set()
+        last_event = 0.0
+        while not cancelled.is_set():
+            if watch is not None:
+                directories = watch.read(INOTIFY_TIMEOUT)
+            else:
+                cancelled.wait(self.__poll_interval)
+                directories = snapshot.get_changed_directories()
+                dirty |= recent
+
+            if directories is None:
+                directories = snapshot.get_directories()
+            if directories:
+                dirty |= directories
+                last_event = time.monotonic()
+
+            if not dirty or time.monotonic() - last_event < self.__debounce or cancelled.is_set():
+                continue
+
+            changes = snapshot.rescan(dirty)
+            recent = dirty if any(changes) else set()
+            dirty = set()
+            if any(changes):
+                messages.put(("changes", self.get_relative_changes(directory, changes)))
+
+    def get_relative_changes(self, directory, changes):
+        return LibraryChanges(sorted((os.path.relpath(path, directory) for path in changes.added), key=str.lower),
+                              [os.path.relpath(path, directory) for path in changes.removed],
+                              [(os.path.relpath(old, directory), os.path.relpath(new, directory)) for old, new in changes.renamed],
+                              [os.path.relpath(path, directory) for path in changes.changed])
@@ -0,0 +1,170 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pygame
+from background_task import BackgroundTask
+from decoding import init_decode_process
+from metadata import Loudness
+from streaming import open_pcm_reader
+
+SEGMENT_SECONDS = 0.1
+BLOCK_SEGMENTS = 4
+CHUNK_SEGMENTS = 100
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+MAX_ATTENUATION = -20.0
+
+K_WEIGHTING_RATE = 48000
+K_WEIGHTING_STAGES = (((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+                      ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)))
+
+
+def get_spectrum_weights(segment_frames, frequency):
+    frequencies = np.fft.rfftfreq(segment_frames, 1 / frequency)
+    z = np.exp(-2j * np.pi * np.minimum(frequencies, K_WEIGHTING_RATE / 2) / K_WEIGHTING_RATE)
+    response = np.ones(len(frequencies), dtype=np.complex128)
+    for numerator, denominator in K_WEIGHTING_STAGES:
+        response *= np.polyval(numerator[::-1], z) / np.polyval(denominator[::-1], z)
+
+    weights = np.abs(response) ** 2 * 2
+    weights[0] /= 2
+    if segment_frames % 2 == 0:
+        weights[-1] /= 2
+    return weights / segment_frames ** 2
+
+
+def get_segment_powers(samples, channels, segment_frames, weights):
+    segment_count = len(samples) // (segment_frames * channels)
+    if not segment_count:
+        return np.empty(0)
+
+    segments = samples[:segment_count * segment_frames * channels].reshape(segment_count, segment_frames, channels)
+    spectrum = np.fft.rfft(segments.astype(np.float32) / 32768, axis=1)
+    powers = np.abs(spectrum) ** 2 * weights[:, None]
+    return powers.sum(axis=(1, 2))
+
+
+def get_integrated_loudness(segment_powers):
+    if len(segment_powers) < BLOCK_SEGMENTS:
+        return None
+
+    block_powers = np.convolve(segment_powers, np.ones(BLOCK_SEGMENTS) / BLOCK_SEGMENTS, mode="valid")
+    with np.errstate(divide="ignore"):
+        block_loudness = -0.691 + 10 * np.log10(block_powers)
+
+    gated = block_powers[block_loudness > ABSOLUTE_GATE]
+    if not len(gated):
+        return None
+    threshold = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+    gated = block_powers[block_loudness > max(ABSOLUTE_GATE, threshold)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def iter_pcm_chunks(path, frames):
+    reader = open_pcm_reader(path)
+    if reader is None:
+        samples = np.frombuffer(memoryview(pygame.mixer.Sound(path)).cast("B"), dtype=np.int16)
+        channels = pygame.mixer.get_init()[2]
+        for start in range(0, len(samples), frames * channels):
+            yield samples[start:start + frames * channels]
+        return
+
+    try:
+        while True:
+            data = reader.read(frames)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype=np.int16)
+    finally:
+        reader.close()
+
+
+def measure_loudness(path):
+    frequency, _, channels = pygame.mixer.get_init()
+    segment_frames = int(frequency * SEGMENT_SECONDS)
+    weights = get_spectrum_weights(segment_frames, frequency)
+
+    segment_powers = []
+    peak = 0
+    carry = np.empty(0, dtype=np.int16)
+    for chunk in iter_pcm_chunks(path, segment_frames * CHUNK_SEGMENTS):
+        if len(chunk):
+            peak = max(peak, int(np.abs(chunk.astype(np.int32)).max()))
+        samples = np.concatenate((carry, chunk)) if len(carry) else chunk
+        powers = get_segment_powers(samples, channels, segment_frames, weights)
+        segment_powers.append(powers)
+        carry = samples[len(powers) * segment_frames * channels:]
+
+    if not segment_powers:
+        return None, 0.0
+    return get_integrated_loudness(np.concatenate(segment_powers)), peak / 32768
+
+
+def get_gain_factor(loudness, target):
+    if loudness is None or loudness.integrated is None:
+        return 1.0
+    gain = max(MAX_ATTENUATION, target - loudness.integrated)
+    factor = 10 ** (gain / 20)
+    if loudness.peak > 0:
+        factor = min(factor, 1 / loudness.peak)
+    return min(1.0, factor)
+
+
+def analyze_file(path):
+    try:
+        stat = os.stat(path)
+        integrated, peak = measure_loudness(path)
+    except (OSError, pygame.error, EOFError):
+        return path, None
+    return path, Loudness(stat.st_size, stat.st_mtime_ns, integrated, peak)
+
+
+class LoudnessScanner(BackgroundTask):
+    def __init__(self, metadata, batch_size=50, max_workers=None):
+        super().__init__()
+        self.__metadata = metadata
+        self.__batch_size = batch_size
+        self.__max_workers = max_workers
+
+    def start(self, paths):
+        self.start_thread(paths)
+
+    def get_pending_paths(self, paths, cancelled):
+        pending = []
+        for path in paths:
+            if cancelled.is_set():
+                break
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.__metadata.get_current_loudness(path, stat) is None:
+                pending.append(path)
+        return pending
+
+    def run(self, paths, messages, cancelled):
+        pending = self.get_pending_paths(paths, cancelled)
+        if pending and not cancelled.is_set():
+            self.analyze(pending, messages, cancelled)
+        if not cancelled.is_set():
+            messages.put(("done", len(pending)))
+
+    def analyze(self, paths, messages, cancelled):
+        measured = []
+        with ProcessPoolExecutor(max_workers=self.__max_workers, initializer=init_decode_process) as executor:
+            results = executor.map(analyze_file, paths, chunksize=4)
+            for done, (path, loudness) in enumerate(results, start=1):
+                if cancelled.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+
+                if loudness is not None:
+                    measured.append((path, loudness))
+                if len(measured) >= self.__batch_size or done == len(paths):
+                    self.__metadata.put_loudness_many(measured)
+                    messages.put(("measured", [path for path, _ in measured]))
+                    measured = []
+                messages.put(("progress", f"Measuring loudness... {done}/{len(paths)}"))
+
+        if measured:
+            self.__metadata.put_loudness_many(measured)
@@ -1,16 +1,35 @@
+import time
+STARTUP_TIME = time.perf_counter()
 import tkinter as tk
 from tkinter import Canvas, filedialog, ttk, messagebox, BOTH
 import os
 import configparser
-import random
+import multiprocessing
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import pygame
-from mutagen.mp3 import MP3
-from mutagen.wave import WAVE
-import subprocess
 import sys
-
-pygame.mixer.pre_init(48000, -16, 2, 2048)
-pygame.init()
+import argparse
+from decoding import DecodePool, SoundCache
+from pcm_cache import PcmDiskCache
+from metadata import MetadataIndex
+from scanner import LibraryScanner
+from tracklist import VirtualListbox
+from player_core import PlayerCore
+from frame_scheduler import FrameScheduler
+from search import SearchIndex, build_search_text
+from loudness import LoudnessScanner
+from waveform import get_peak_columns, load_or_build_peaks, load_peaks, prune_peaks, remove_peaks
+from editor import EDITOR_COMMAND, EditSession, find_editor
+from library_watcher import LibraryWatcher
+from play_queue import QUEUE_PATH, PlayQueue, load_queue
+from session import SessionStore
+from tracing import configure_tracing, tracer
+
+WAVEFORM_HEIGHT = 96
+EDIT_POLL_MS = 500
+DEFERRED_SCAN_MS = 3000
+QUEUE_SAVE_MS = 2000
 
 class MusicPlayerWindow:
     def __init__(self, root):
@@ -19,87 +38,101 @@ class MusicPlayerWindow:
         else:
             icon_dir = "icons"
 
-        self.play_button = tk.PhotoImage(file=os.path.join(icon_dir, "play.png"))
-        self.pause_button = tk.PhotoImage(file=os.path.join(icon_dir, "pause.png"))
-        self.next_track_button = tk.PhotoImage(file=os.path.join(icon_dir, "next_track.png"))
-        self.previous_track_button = tk.PhotoImage(file=os.path.join(icon_dir, "previous_track.png"))
-        self.shuffle_button = tk.PhotoImage(file=os.path.join(icon_dir, "shuffle.png"))
-        self.no_shuffle_button = tk.PhotoImage(file=os.path.join(icon_dir, "no_shuffle.png"))
-        self.repeat_all_button = tk.PhotoImage(file=os.path.join(icon_dir, "repeat_all.png"))
-        self.repeat_one_button = tk.PhotoImage(file=os.path.join(icon_dir, "repeat_one.png"))
-        self.no_repeat_button = tk.PhotoImage(file=os.path.join(icon_dir, "no_repeat.png"))
-        self.volume_button = tk.PhotoImage(file=os.path.join(icon_dir, "volume.png"))
-        self.volume_mute_button = tk.PhotoImage(file=os.path.join(icon_dir, "volume_mute.png"))
+        self.__icon_dir = icon_dir
+        self.__icons = {}
 
         self.__config = configparser.ConfigParser()
-        self.__config.read("config.ini", encoding="utf-8")
+        with tracer.span("config.read"):
+            self.__config.read("config.ini", encoding="utf-8")
 
-        if self.__config.has_option("Settings", "width") and self.__config.has_option("Settings", "height"):
-            width = int(self.__config.get("Settings", "width"))
-            height = int(self.__config.get("Settings", "height"))
-        else:
-            width = 1280
-            height = 720
-    
-        self.__width = width
-        self.__height = height
+        self.__session = SessionStore()
+        session = self.load_session()
+
+        self.__width = session.get("width", 1280)
+        self.__height = session.get("height", 720)
         self.__root = root
         self.__root.title("Music Playditor")
         self.__root.geometry(f"{self.__width}x{self.__height}")
 
         self.__last_directory = None
-        self.__current_index = None
-        self.__last_played_file = None
         self.__file_list = None
-        self.__directory = None
         self.__starting = True
         self.__clicking_slider = False
-
-        self.__channel_one_or_two = False
-        self.__channel_one = pygame.mixer.Channel(0)
-        self.__channel_two = pygame.mixer.Channel(1)
-
-        self.__shuffled_files_index = -1
-        self.__current_shuffled_index = 0
-        self.__shuffled_files_list = []
-
-        self.__current_position = 0
-        self.__total_duration = 0
-        self.__audio_tracking_id = 0
-        self.__volume = 1
-        self.__play_state = {"paused": True,
-                             "repeating": False,
-                             "shuffle": False,
-                             "muted": False}
+        self.__saved_shuffle = None
+
+        decode_cache_mb = self.__config.getint("Settings", "decode_cache_mb", fallback=256)
+        pcm_cache_mb = self.__config.getint("Settings", "pcm_cache_mb", fallback=0)
+        pcm_cache = PcmDiskCache(pcm_cache_mb * 1024 * 1024) if pcm_cache_mb > 0 else None
+        self.__decode_pool = DecodePool(SoundCache(decode_cache_mb * 1024 * 1024), disk_cache=pcm_cache)
+        self.__metadata = MetadataIndex("library.db")
+        self.__background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+        self.__indexing = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indexing")
+        self.__core = PlayerCore(self.__metadata, self.__decode_pool, self.__background,
+                                 streaming=self.__config.getboolean("Settings", "streaming", fallback=False),
+                                 crossfade_seconds=self.__config.getfloat("Settings", "crossfade_seconds", fallback=0.0),
+                                 loudness_target=self.__config.getfloat("Settings", "loudness_target", fallback=-18.0))
+
+        self.__scanner = LibraryScanner(self.__metadata)
+        self.__loudness_scanner = LoudnessScanner(self.__metadata)
+        self.__watcher = LibraryWatcher()
+        self.__watch_library = self.__config.getboolean("Settings", "watch_library", fallback=True)
+        self.__peaks_cache_bytes = self.__config.getint("Settings", "peaks_cache_mb", fallback=64) * 1024 * 1024
+        self.__search = SearchIndex()
+        self.__file_indices = {}
+        self.__search_future = None
+        self.__restore_file = None
+        self.__restore_scrollbar_position = None
+        self.__edit_sessions = {}
+        self.__reload_position = None
+
+        self.__current_position = session.get("position") or 0
+        self.__slider_duration = 0
+        self.__volume = session.get("volume", 1)
+        self.__play_state = self.__core.get_play_state()
+        self.__core.set_volume(self.__volume)
+        pygame.mixer.music.set_volume(self.__volume)
+
+        self.__frames = FrameScheduler(self.__root)
+        self.__slider_value = None
+        self.__duration_text = None
 
         self.__options_frame = tk.Frame(self.__root)
         self.__options_frame.pack(fill=BOTH, expand=True)
 
-        self.__load_button = HoverButton(self.__options_frame, text="Load", command=self.load_files, relief="flat")
+        self.__load_button = HoverButton(self.__options_frame, scheduler=self.__frames, text="Load", command=self.load_files, relief="flat")
         self.__load_button.pack(side=tk.LEFT, anchor=tk.NW)
 
-        self.__edit_button = HoverButton(self.__options_frame, text="Edit", command=self.edit_files, relief="flat")
+        self.__import_button = HoverButton(self.__options_frame, scheduler=self.__frames, text="Import", command=self.import_playlist, relief="flat")
+        self.__import_button.pack(side=tk.LEFT, anchor=tk.NW)
+
+        self.__export_button = HoverButton(self.__options_frame, scheduler=self.__frames, text="Export", command=self.export_queue, relief="flat")
+        self.__export_button.pack(side=tk.LEFT, anchor=tk.NW)
+
+        self.__clear_queue_button = HoverButton(self.__options_frame, scheduler=self.__frames, text="Clear queue", command=self.clear_queue, relief="flat")
+        self.__clear_queue_button.pack(side=tk.LEFT, anchor=tk.NW)
+
+        self.__edit_button = HoverButton(self.__options_frame, scheduler=self.__frames, text="Edit", command=self.edit_files, relief="flat")
         self.__edit_button.pack(side=tk.LEFT, anchor=tk.NW, padx=(0, 100))
 
-        self.__shuffle_button = HoverButton(self.__options_frame, image=self.no_shuffle_button, relief="flat", 
-                                            command=lambda: self.toggle_playback(self.__shuffle_button, self.no_shuffle_button, self.shuffle_button, "shuffle"))
+        self.__shuffle_button = HoverButton(self.__options_frame, scheduler=self.__frames, image=self.get_icon("no_shuffle"), relief="flat", 
+                                            command=lambda: self.toggle_playback(self.__shuffle_button, self.get_icon("no_shuffle"), self.get_icon("shuffle"), "shuffle"))
         self.__shuffle_button.pack(side=tk.LEFT, anchor=tk.NW)
 
-        self.__previous_track_button = HoverButton(self.__options_frame, image=self.previous_track_button, relief="flat", command=self.play_previous)
+        self.__previous_track_button = HoverButton(self.__options_frame, scheduler=self.__frames, image=self.get_icon("previous_track"), relief="flat", command=self.play_previous)
         self.__previous_track_button.pack(side=tk.LEFT, anchor=tk.NW)
         self.__root.bind("<p>", self.play_previous)
 
-        self.__play_button = HoverButton(self.__options_frame, image=self.play_button, relief="flat", 
-                                         command=lambda: self.pause_play_track(self.__play_button, self.pause_button, self.play_button, "paused"))
+        self.__play_button = HoverButton(self.__options_frame, scheduler=self.__frames, image=self.get_icon("play"), relief="flat", 
+                                         command=lambda: self.pause_play_track(self.__play_button, self.get_icon("pause"), self.get_icon("play"), "paused"))
         self.__play_button.pack(side=tk.LEFT, anchor=tk.NW)
-        self.__root.bind("<space>", lambda event: self.pause_play_track(self.__play_button, self.pause_button, self.play_button, "paused"))
+        self.__root.bind("<space>", lambda event: self.pause_play_track(self.__play_button, self.get_icon("pause"), self.get_icon("play"), "paused"))
 
-        self.__next_track_button = HoverButton(self.__options_frame, image=self.next_track_button, command=self.play_next, relief="flat")
+        self.__next_track_button = HoverButton(self.__options_frame, scheduler=self.__frames, image=self.get_icon("next_track"), command=self.play_next, relief="flat")
         self.__next_track_button.pack(side=tk.LEFT, anchor=tk.NW)
         self.__root.bind("<n>", self.play_next)
 
-        self.__repeat_button = HoverButton(self.__options_frame, image=self.no_repeat_button, relief="flat", 
-                                            command=lambda: self.toggle_playback(self.__repeat_button, self.no_repeat_button, self.repeat_one_button, "repeating"))
+        self.__repeat_button = HoverButton(self.__options_frame, scheduler=self.__frames, image=self.get_icon("no_repeat"), relief="flat", 
+                                            command=lambda: self.toggle_playback(self.__repeat_button, self.get_icon("no_repeat"), self.get_icon("repeat_one"), "repeating"))
         self.__repeat_button.pack(side=tk.LEFT, anchor=tk.NW, padx=(0, 50))
 
         self.__volume_slider = ttk.Scale(self.__options_frame, from_=0.0, to=1.0, orient="horizontal") 
@@ -107,9 +140,11 @@ class MusicPlayerWindow:
         self.__volume_slider.bind("<ButtonRelease-1>", lambda event: self.set_volume(event))
         self.__volume_slider.set(self.__volume)
 
-        self.__volume_button = HoverButton(self.__options_frame, image=self.volume_button, command=self.mute_unmute_volume, relief="flat")
+        self.__volume_button = HoverButton(self.__options_frame, scheduler=self.__frames, image=self.get_icon("volume"), command=self.mute_unmute_volume, relief="flat")
         self.__volume_button.pack(side=tk.LEFT, anchor=tk.NW, padx=(0, 50))
         self.__root.bind("<m>", self.mute_unmute_volume)
+        self.__root.bind("<q>", self.enqueue_selected)
+        self.__root.bind("<Q>", lambda event: self.enqueue_selected(play_next=True))
 
         self.__audio_duration_slider = ttk.Scale(self.__options_frame, from_=0, to=100, orient="horizontal")
         self.__audio_duration_slider.pack(side=tk.LEFT, anchor=tk.NW, fill=BOTH, expand=True)
@@ -118,11 +153,22 @@ class MusicPlayerWindow:
         self.__audio_duration_label = tk.Label(self.__options_frame, text="--:--/--:--")
         self.__audio_duration_label.pack(side=tk.LEFT, anchor=tk.NW, padx=(0, 20))
 
+        self.__scan_label = tk.Label(self.__options_frame, text="")
+        self.__scan_label.pack(side=tk.RIGHT, anchor=tk.NE, padx=(0, 20))
+
+        self.__search_text = tk.StringVar()
+        self.__search_text.trace_add("write", lambda *args: self.__frames.call_later("search", 0, self.apply_search))
+        self.__search_entry = tk.Entry(self.__options_frame, textvariable=self.__search_text)
+        self.__search_entry.pack(side=tk.RIGHT, anchor=tk.NE, padx=(0, 20))
+        self.__search_entry.bindtags((str(self.__search_entry), "Entry", "all"))
+        self.__search_entry.bind("<Escape>", lambda event: self.__search_text.set(""))
+        self.__search_entry.bind("<Return>", self.play_first_search_result)
+
 
         self.__listbox_frame = tk.Frame(self.__root)
         self.__listbox_frame.pack(fill=BOTH, expand=True)
 
-        self.__file_listbox = tk.Listbox(self.__listbox_frame, background="SystemButtonFace", height=self.__height)
+        self.__file_listbox = VirtualListbox(self.__listbox_frame, background="SystemButtonFace", height=self.__height)
         self.__file_listbox.pack(side=tk.LEFT, anchor=tk.S, fill=BOTH, expand=True, pady=(0, 10))
         self.__file_listbox.bind("<Double-Button-1>", self.play_selected_file)
 
@@ -131,315 +177,375 @@ class MusicPlayerWindow:
         self.__file_listbox.config(yscrollcommand=self.__listbox_scrollbar.set)
 
 
-        self.__canvas = Canvas(self.__root, width=self.__width, height=self.__height)
-        self.__canvas.pack()
+        self.__canvas = Canvas(self.__root, width=self.__width, height=WAVEFORM_HEIGHT, background="#012440", highlightthickness=0)
+        self.__canvas.pack(fill=tk.X)
+        self.__canvas.bind("<Configure>", lambda event: self.draw_waveform())
+        self.__waveform_peaks = None
+        self.__playhead_x = None
         self.__root.protocol("WM_DELETE_WINDOW", self.close)
 
-        self.__audio_finished_event = pygame.USEREVENT + 1
+        if session.get("directory"):
+            self.__last_directory = session["directory"]
+            self.__core.set_current_file(session.get("file"))
+            self.__restore_file = self.__core.get_current_file()
+            if self.__restore_file and self.__current_position:
+                self.__reload_position = self.__current_position
 
-        if self.__config.has_option("Settings", "last_directory"):
-            self.__last_directory = self.__config.get("Settings", "last_directory")
-            self.__last_played_file = self.__config.get("Settings", "last_played_file", fallback="")
-            self.load_files()
-            if self.__last_played_file:
-                index = self.__file_list.index(self.__last_played_file)
-                self.__file_listbox.select_set(index)
-                self.play_file_at_index(index)
+        if session.get("shuffle_order"):
+            self.__saved_shuffle = tuple(session["shuffle_order"])
 
-        if self.__config.has_option("Settings", "scrollbar_position"):
-            scrollbar_position = float(self.__config.get("Settings", "scrollbar_position"))
-            self.__file_listbox.yview_moveto(scrollbar_position)
+        if session.get("shuffle"):
+            self.__core.set_play_state("shuffle", True)
+            self.__shuffle_button.config(image=self.get_icon("shuffle"))
 
-        if self.__file_list:
-            self.configure_file_list()
+        if session.get("repeating"):
+            self.__core.set_play_state("repeating", True)
+            self.__repeat_button.config(image=self.get_icon("repeat_one"))
 
-        self.__root.after(100, self.check_audio_finished)
+        if session.get("muted"):
+            self.__core.set_muted(True)
+            pygame.mixer.music.set_volume(0)
+            self.__volume_button.config(image=self.get_icon("volume_mute"))
 
-    def configure_file_list(self):
-        for index in range(len(self.__file_list)):
-            if index % 2 == 0:
-                bg_color = "#072a47"
+        self.__restore_scrollbar_position = session.get("scrollbar_position")
+
+        self.__root.bind("<Map>", self.on_first_map, add="+")
+        if self.__last_directory:
+            files = self.__metadata.get_listing(self.__last_directory)
+            if files:
+                self.restore_library(self.__last_directory, files)
             else:
-                bg_color = "#012440"
-            self.__file_listbox.itemconfigure(index, foreground="light gray", background=bg_color)
+                self.load_files()
+
+        self.__queue_future = self.__background.submit(load_queue)
+        self.__import_future = None
+        self.__frames.call_later("queue_load", 50, self.wait_for_queue)
+
+        if tracer.is_enabled():
+            self.__root.bind("<F12>", lambda event: print(tracer.format_summary(), file=sys.stderr))
+
+    def load_session(self):
+        session = self.__session.load()
+        if session or not self.__config.has_section("Settings"):
+            return session
+
+        settings = self.__config["Settings"]
+        session = {"directory": settings.get("last_directory"), "file": settings.get("last_played_file") or None}
+        if "width" in settings and "height" in settings:
+            session["width"] = settings.getint("width")
+            session["height"] = settings.getint("height")
+        if "scrollbar_position" in settings:
+            session["scrollbar_position"] = settings.getfloat("scrollbar_position")
+        if "shuffle_seed" in settings:
+            session["shuffle_order"] = [settings.getint("shuffle_size"), settings.getint("shuffle_seed"), settings.getint("shuffle_cursor")]
+        return session
+
+    def save_session(self):
+        shuffle_state = self.__core.get_shuffle_state()
+        self.__session.update(directory=self.__last_directory,
+                              file=self.__core.get_current_file(),
+                              position=round(self.__current_position, 1),
+                              shuffle=self.__play_state["shuffle"],
+                              shuffle_order=list(shuffle_state) if shuffle_state else None,
+                              repeating=self.__play_state["repeating"],
+                              volume=self.__volume,
+                              muted=self.__play_state["muted"])
+
+    def get_icon(self, name):
+        icon = self.__icons.get(name)
+        if icon is None:
+            icon = self.__icons[name] = tk.PhotoImage(file=os.path.join(self.__icon_dir, f"{name}.png"))
+        return icon
+
+    def on_first_map(self, event):
+        if event.widget is self.__root:
+            self.__root.unbind("<Map>")
+            tracer.add_span("startup.window", STARTUP_TIME, time.perf_counter())
 
     def pause_play_track(self, button, button_icon1, button_icon2, bool, event=None):
-        if self.__root.title() == "Music Playditor" and self.__last_played_file:
-            self.play_file(self.__last_played_file)
-            self.__root.title(f"Music Playditor - {self.__last_played_file}")
-
-        if self.__play_state[bool]:
-            if self.__channel_one_or_two:
-                self.__channel_one.unpause()
-                pygame.mixer.music.unpause()
-                self.toggle_playback(button, button_icon1, button_icon2, bool)
-
-                if pygame.mixer.music.get_busy():
-                    self.track_audio_duration(pygame.mixer.music)
-                else:
-                    self.track_audio_duration(self.__channel_one)
-            else:
-                self.__channel_two.unpause()
-                pygame.mixer.music.unpause()
-                self.toggle_playback(button, button_icon1, button_icon2, bool)
-
-                if pygame.mixer.music.get_busy():
-                    self.track_audio_duration(pygame.mixer.music)
-                else:
-                    self.track_audio_duration(self.__channel_two)
+        if self.__root.title() == "Music Playditor" and self.__core.get_current_file():
+            self.play_file(self.__core.get_current_file(), self.__reload_position or 0.0)
+            self.__root.title(f"Music Playditor - {self.__core.get_current_file()}")
+
+        if self.__play_state[bool] and self.__reload_position is not None:
+            self.toggle_playback(button, button_icon1, button_icon2, bool)
+            self.play_file(self.__core.get_current_file(), self.__current_position if self.__clicking_slider else self.__reload_position)
+        elif self.__play_state[bool]:
+            self.__core.resume()
+            self.toggle_playback(button, button_icon1, button_icon2, bool)
+            self.track_audio_duration(self.__core.get_playing())
         else:
-            if self.__channel_one_or_two:
-                self.__channel_one.pause()
-                pygame.mixer.music.pause()
-                self.toggle_playback(button, button_icon1, button_icon2, bool)
-            else:
-                self.__channel_two.pause()
-                pygame.mixer.music.pause()
-                self.toggle_playback(button, button_icon1, button_icon2, bool)
+            self.__core.pause()
+            self.toggle_playback(button, button_icon1, button_icon2, bool)
+            self.__current_position = self.__core.get_position()
+            self.save_session()
 
-        if self.__current_index:
+        if self.__core.get_current_index() is not None:
             self.__file_listbox.selection_clear(0, tk.END)
-            if self.__current_shuffled_index:
-                self.__file_listbox.select_set(self.__current_shuffled_index)
-            else:
-                self.__file_listbox.select_set(self.__current_index)
+            self.__file_listbox.select_set(self.__core.get_current_index())
 
     def toggle_playback(self, button, button_icon1, button_icon2, bool, event=None):
-        self.__play_state[bool] = not self.__play_state[bool]
+        self.__core.set_play_state(bool, not self.__play_state[bool])
         current_image = button.cget("image")
         new_image = button_icon2 if str(current_image) == str(button_icon1) else button_icon1
         button.config(image=new_image)
+        self.save_session()
 
     def check_audio_finished(self):
-        for event in pygame.event.get():
-            if event.type == self.__audio_finished_event and (self.__total_duration - self.__current_position) < 4:
-                self.play_next()
-        self.__root.after(100, self.check_audio_finished)
+        if self.__core.get_remaining_time() < 4:
+            self.play_next()
 
     def play_selected_file(self, event=None):
-        self.__play_button.config(image=self.pause_button)
+        self.__play_button.config(image=self.get_icon("pause"))
         if self.__play_state["paused"]:
             self.__play_state["paused"] = not self.__play_state["paused"]
 
         selected_index = self.__file_listbox.curselection()
-        self.__current_index = selected_index[0]
 
         if selected_index:
+            self.__core.select_index(selected_index[0])
+
             selected_file = self.__file_list[selected_index[0]]
             if selected_file.lower().endswith(('.mp3', '.wav')):
                 self.__root.title(f"Music Playditor - {selected_file}")
-                self.__last_played_file = selected_file
-
-                if self.__audio_tracking_id:
-                    self.__root.after_cancel(self.__audio_tracking_id)
 
+                self.__frames.cancel("tracking")
                 self.play_file(selected_file)
 
-    def play_file(self, file):
-        self.__current_position = 0
+    def play_file(self, file, position=0.0):
+        self.__current_position = position
+        self.__reload_position = None
+        try:
+            playing = self.__core.play_file(file, position)
+        except (pygame.error, OSError):
+            messagebox.showerror("Error", f"Could not decode {file}.")
+            return
 
-        if self.__root.title() == "Music Playditor" and self.__last_played_file:
-            if self.__channel_one_or_two:
-                self.track_audio_duration(self.__channel_two)
-                self.__channel_one_or_two = False
-                self.__channel_one.stop()
-                self.__channel_two.queue(pygame.mixer.Sound(os.path.join(self.__directory, file)))
+        if playing is None:
+            self.__frames.call_later("decode", 5, self.wait_for_decoded_sound, file)
+        else:
+            self.start_tracking(playing)
 
-                self.__channel_two.set_endevent(0)
-            else:
-                self.track_audio_duration(self.__channel_one)
-                self.__channel_one_or_two = True
-                self.__channel_two.stop()
-                self.__channel_one.queue(pygame.mixer.Sound(os.path.join(self.__directory, file)))
+    def wait_for_decoded_sound(self, file):
+        if file != self.__core.get_pending_file():
+            return
 
-                self.__channel_one.set_endevent(0)
+        try:
+            playing = self.__core.poll_pending()
+        except (pygame.error, OSError):
+            messagebox.showerror("Error", f"Could not decode {file}.")
+            return
+
+        if playing is None:
+            self.__frames.call_later("decode", 5, self.wait_for_decoded_sound, file)
         else:
-            if self.__channel_one_or_two:
-                self.__channel_one_or_two = False
-                self.__channel_one.stop()
-                self.__channel_two.queue(pygame.mixer.Sound(os.path.join(self.__directory, file)))
-                self.track_audio_duration(self.__channel_two)
+            self.start_tracking(playing)
 
-                self.__channel_two.set_endevent(0)
-            else:
-                self.__channel_one_or_two = True
-                self.__channel_two.stop()
-                self.__channel_one.queue(pygame.mixer.Sound(os.path.join(self.__directory, file)))
-                self.track_audio_duration(self.__channel_one)
+    def start_tracking(self, playing):
+        self.__clicking_slider = False
+        self.__frames.cancel("tracking")
+        self.track_audio_duration(playing)
+        self.show_waveform(self.__core.get_current_file())
+        self.save_session()
+        self.queue_changed()
+
+    def show_current_track(self):
+        index = self.__core.get_current_index()
+        self.__root.title(f"Music Playditor - {self.__core.get_current_file()}")
+        self.__file_listbox.selection_clear(0, tk.END)
+        if index is not None and self.__file_list[index] == self.__core.get_current_file():
+            self.__file_listbox.select_set(index)
+            self.__file_listbox.see(index)
+
+    def get_file_path(self, file):
+        return self.__core.get_file_path(file)
 
-                self.__channel_one.set_endevent(0)
- 
     def play_previous(self, event=None):
-        self.__play_button.config(image=self.pause_button)
+        self.__play_button.config(image=self.get_icon("pause"))
         if self.__play_state["paused"]:
             self.__play_state["paused"] = not self.__play_state["paused"]
 
-        if self.__current_position < 3:
-            if self.__shuffled_files_list:
-                try:
-                    self.__shuffled_files_index -= 1
-
-                    self.__current_shuffled_index = self.__shuffled_files_list[self.__shuffled_files_index]
-                except IndexError:
-                    self.__shuffled_files_index = -1
-                    self.__current_shuffled_index = self.__shuffled_files_list[self.__shuffled_files_index]
-
-                self.__file_listbox.selection_clear(0, tk.END)
-                
-                self.__last_played_file = self.__file_list[self.__current_shuffled_index]
-                self.__file_listbox.select_set(self.__current_shuffled_index)
-                self.__file_listbox.see(self.__current_shuffled_index)
-                self.__root.title(f"Music Playditor - {self.__last_played_file}")
-            else:
-                self.__current_index -= 1
-                previous_position = self.__current_index
-
-                self.__file_listbox.selection_clear(0, tk.END)
-
-                self.__last_played_file = self.__file_list[previous_position]
-                self.__file_listbox.select_set(previous_position)
-                self.__file_listbox.see(previous_position)
-                self.__root.title(f"Music Playditor - {self.__last_played_file}")
+        file = self.__core.move_to_previous()
+        if file is None:
+            return
 
-        self.play_file(self.__last_played_file)
+        self.show_current_track()
+        self.play_file(file)
 
     def play_next(self, event=None):
-        self.__play_button.config(image=self.pause_button)
+        self.__play_button.config(image=self.get_icon("pause"))
         if self.__play_state["paused"]:
             self.__play_state["paused"] = not self.__play_state["paused"]
 
-        if not self.__play_state["shuffle"] and self.__current_shuffled_index:
-            self.__current_index = self.__current_shuffled_index
-            self.__current_shuffled_index = 0
-            self.__shuffled_files_index = -1
-
-        if self.__shuffled_files_index != -1:
-            self.__current_shuffled_index = self.__shuffled_files_list[self.__shuffled_files_index + 1]
-            self.__shuffled_files_index += 1
-
-            self.__last_played_file = self.__file_list[self.__current_shuffled_index]
-
-            self.play_file(self.__last_played_file)
-        else:
-            if self.__current_index:
-                if not self.__play_state["repeating"]:
-                    increase_by = 1
-                    if self.__play_state["shuffle"]:
-                        increase_by = random.randint(1, len(self.__file_list) - 1)
-
-                    next_index = (self.__current_index + increase_by) % len(self.__file_list)
-
-                    self.__last_played_file = self.__file_list[next_index]
-                    self.__file_listbox.select_set(next_index)
-
-                    self.__root.title(f"Music Playditor - {self.__file_list[next_index]}")
-
-                    if increase_by != 1:
-                        self.__current_shuffled_index = next_index
-                        self.__shuffled_files_list.append(self.__current_shuffled_index)
-                    else:
-                        self.__shuffled_files_list = []
-
-                    self.__file_listbox.selection_clear(0, tk.END)
-
-                    if self.__audio_tracking_id:
-                        self.__root.after_cancel(self.__audio_tracking_id)
-
-                    self.play_file_at_index(next_index)
+        file = self.__core.move_to_next()
+        if file is None:
+            return
 
-                    self.__file_listbox.see(next_index)
-                else:
-                    self.play_file_at_index(self.__current_index)
+        self.__frames.cancel("tracking")
+        self.play_file(file)
+        self.show_current_track()
 
     def play_file_at_index(self, index):
+        self.__core.select_index(index)
+        self.__file_listbox.select_set(index)
         if index < len(self.__file_list) and not self.__starting:
-            self.__current_index = index
-            self.__file_listbox.select_set(index)
             self.play_file(self.__file_list[index])
         else:
-            self.__current_index = index
-            self.__file_listbox.select_set(index)
             self.__starting = False
 
     def update_audio_slider_and_label(self):
-            full_time = self.get_total_audio_duration(self.__last_played_file)
+            full_time = self.get_total_audio_duration()
+            total_duration = self.__core.get_total_duration()
 
+            if not self.__clicking_slider:
+                self.__current_position = self.__core.get_position()
             current_position = self.__current_position
-            self.__current_position += 0.1
 
             current_minutes = int(current_position // 60)
             current_seconds = int(current_position % 60)
             current_time = f"{current_minutes:02d}:{current_seconds:02d}"
 
-            self.__audio_duration_slider.set(current_position)
-            
-            self.__audio_duration_label.configure(text=f"{current_time}/{full_time}")
+            slider_step = total_duration / max(1, self.__audio_duration_slider.winfo_width())
+            if self.__slider_value is None or abs(current_position - self.__slider_value) >= slider_step:
+                self.__slider_value = current_position
+                self.__audio_duration_slider.set(current_position)
+
+            if total_duration:
+                playhead_x = int(current_position / total_duration * self.__canvas.winfo_width())
+                if playhead_x != self.__playhead_x:
+                    self.__playhead_x = playhead_x
+                    self.__canvas.coords("playhead", playhead_x, 0, playhead_x, WAVEFORM_HEIGHT)
+
+            duration_text = f"{current_time}/{full_time}"
+            if duration_text != self.__duration_text:
+                self.__duration_text = duration_text
+                self.__audio_duration_label.configure(text=duration_text)
 
     def track_audio_duration(self, file):
-        if self.__play_state["paused"]:
+        if self.__play_state["paused"] or self.__core.get_pending_file() is not None:
             pass
         else:
-            if self.__clicking_slider or pygame.mixer.music.get_busy():
-                if isinstance(file, pygame.mixer.Channel):
-                    file.stop()
-                    pygame.mixer.music.load(os.path.join(self.__directory, self.__last_played_file))
-                    pygame.mixer.music.play()
-
-                if self.__clicking_slider:
-                    pygame.mixer.music.set_pos((self.__current_position))
-                    self.__clicking_slider = False
-
+            if self.__clicking_slider:
+                file = self.seek_to(self.__current_position)
+                if file is None:
+                    return
+                self.__clicking_slider = False
+
+            started = self.__core.commit_started_transition()
+            if started is not None:
+                file = started
+                self.show_current_track()
+                self.queue_changed()
+                self.show_waveform(self.__core.get_current_file())
+
+            if file.get_busy():
+                self.__core.schedule_next_transition()
                 self.update_audio_slider_and_label()
-                self.__audio_tracking_id = self.__root.after(100, self.track_audio_duration, self.__last_played_file)
+                self.save_session()
+                self.__frames.call_later("tracking", self.get_tracking_interval(), self.track_audio_duration, file)
             else:
-                if isinstance(file, pygame.mixer.Channel) and file.get_busy():
-                    self.update_audio_slider_and_label()
-                    self.__audio_tracking_id = self.__root.after(100, self.track_audio_duration, file)
-                else:
-                    pygame.event.post(pygame.event.Event(self.__audio_finished_event))
-
-    def get_total_audio_duration(self, file):
-        file_extension_index = file.rfind(".")
-        file_extension = file[file_extension_index+1:]
-        if file_extension == "mp3":
-            audio = MP3(os.path.join(self.__directory, file))
+                self.__core.mark_track_ended()
+                self.__frames.call_later("events", 0, self.check_audio_finished)
+
+    def get_tracking_interval(self):
+        if self.__root.state() in ("iconic", "withdrawn"):
+            interval = 1000
+        else:
+            interval = 100
+
+        remaining = int((self.__core.get_total_duration() - self.__current_position) * 1000)
+        return max(10, min(interval, remaining + 10))
+
+    def seek_to(self, position):
+        playing = self.__core.seek(position)
+        if playing is None:
+            self.__frames.call_later("seek", 5, self.wait_for_seek)
+        return playing
+
+    def wait_for_seek(self):
+        if not self.__clicking_slider:
+            return
+
+        if self.__core.is_seek_pending():
+            self.__frames.call_later("seek", 5, self.wait_for_seek)
         else:
-            audio = WAVE(os.path.join(self.__directory, file))
-        full_duration = audio.info.length
+            self.track_audio_duration(self.__core.get_playing())
+
+    def get_total_audio_duration(self):
+        full_duration = self.__core.refresh_total_duration()
+        if full_duration is None:
+            return "--:--"
+
         full_minutes = int(full_duration // 60)
         full_seconds = int(full_duration % 60)
         full_time = f"{full_minutes:02d}:{full_seconds:02d}"
 
-        self.__audio_duration_slider.configure(to=int(full_duration))
-
-        self.__total_duration = full_duration
+        if full_duration != self.__slider_duration:
+            self.__audio_duration_slider.configure(to=int(full_duration))
+            self.__slider_duration = full_duration
 
         return full_time
 
+    def show_waveform(self, file):
+        path = self.get_file_path(file)
+        self.__waveform_peaks = load_peaks(path)
+        self.draw_waveform()
+        if self.__waveform_peaks is None:
+            sound = self.__core.get_decoded_sound(file)
+            future = self.__background.submit(load_or_build_peaks, path, sound)
+            self.__frames.call_later("waveform", 50, self.wait_for_waveform, file, future)
+
+    def wait_for_waveform(self, file, future):
+        if file != self.__core.get_current_file():
+            return
+        if not future.done():
+            self.__frames.call_later("waveform", 50, self.wait_for_waveform, file, future)
+        elif future.exception() is None:
+            self.__waveform_peaks = future.result()
+            self.draw_waveform()
+
+    def draw_waveform(self):
+        self.__canvas.delete("all")
+        self.__playhead_x = None
+        width = self.__canvas.winfo_width()
+        if self.__waveform_peaks is None or width <= 1:
+            return
+
+        lows, highs = get_peak_columns(self.__waveform_peaks, width)
+        if lows is None:
+            return
+
+        scale = WAVEFORM_HEIGHT / 65536
+        middle = WAVEFORM_HEIGHT / 2
+        step = width / len(lows)
+        top = [coordinate for x, high in enumerate(highs.tolist()) for coordinate in (x * step, middle - high * scale)]
+        bottom = [coordinate for x, low in reversed(list(enumerate(lows.tolist()))) for coordinate in (x * step, middle - low * scale)]
+        self.__canvas.create_polygon(top + bottom, fill="#2f6ea5", outline="#2f6ea5")
+        self.__canvas.create_line(0, 0, 0, WAVEFORM_HEIGHT, fill="light gray", tags="playhead")
+
     def on_slider_click(self, event):
         self.__clicking_slider = True
         click_position = event.x
-        total_duration = self.__total_duration
+        total_duration = self.__core.get_total_duration()
         desired_position = (click_position / self.__audio_duration_slider.winfo_width()) * total_duration
-        self.__current_position = int(desired_position)
+        self.__current_position = desired_position
 
-        self.update_audio_slider_and_label()
+        if self.__play_state["paused"] or self.__core.get_pending_file() is not None:
+            self.update_audio_slider_and_label()
+        else:
+            self.__frames.cancel("tracking")
+            self.track_audio_duration(self.__core.get_playing())
 
     def mute_unmute_volume(self, event=None):
         if pygame.mixer.music.get_volume():
-            self.__volume_button.config(image=self.volume_mute_button)
-            self.__play_state["muted"] = True
-
+            self.__volume_button.config(image=self.get_icon("volume_mute"))
             pygame.mixer.music.set_volume(0)
-            self.__channel_one.set_volume(0)
-            self.__channel_two.set_volume(0)
+            self.__core.set_muted(True)
         else:
-            self.__volume_button.config(image=self.volume_button)
-            self.__play_state["muted"] = False
-
+            self.__volume_button.config(image=self.get_icon("volume"))
             pygame.mixer.music.set_volume(self.__volume)
-            self.__channel_one.set_volume(self.__volume)
-            self.__channel_two.set_volume(self.__volume)
+            self.__core.set_muted(False)
+        self.save_session()
 
     def set_volume(self, event):
         if not self.__play_state["muted"]:
@@ -453,69 +559,375 @@ class MusicPlayerWindow:
             self.__volume_slider.set(desired_position)
 
             pygame.mixer.music.set_volume(desired_position)
-            self.__channel_one.set_volume(desired_position)
-            self.__channel_two.set_volume(desired_position)
+            self.__core.set_volume(desired_position)
+            self.save_session()
 
     def load_files(self):
         if not self.__last_directory or not self.__starting:
-            self.__directory = filedialog.askdirectory(initialdir=self.__last_directory)
+            directory = filedialog.askdirectory(initialdir=self.__last_directory)
+        else:
+            directory = self.__last_directory
+
+        if directory:
+            self.__last_directory = directory
+            self.save_session()
+
+            self.__file_list = []
+            self.__file_indices = {}
+            self.__core.set_library(directory, self.__file_list)
+            self.__file_listbox.set_items(self.__file_list)
+            self.__indexing.submit(self.__search.clear)
+
+            self.__loudness_scanner.cancel()
+            self.__frames.cancel("loudness")
+            self.__watcher.cancel()
+            self.__frames.cancel("watch")
+            self.__scanner.start(directory)
+            self.__frames.cancel("scan")
+            self.poll_library_scan()
+
+    def poll_library_scan(self):
+        for kind, value in self.__scanner.get_messages():
+            if kind == "files":
+                for index, file in enumerate(value, len(self.__file_list)):
+                    self.__file_indices[file] = index
+                self.__file_list.extend(value)
+                self.__file_listbox.refresh()
+                self.__search_future = self.__indexing.submit(self.index_search_texts, value)
+                self.refresh_search()
+
+                if self.__restore_file in value:
+                    self.restore_last_played_file()
+            elif kind == "tagged":
+                indices = [self.__file_indices.get(os.path.relpath(path, self.__core.get_directory())) for path in value]
+                self.__search_future = self.__indexing.submit(self.update_search_texts, [index for index in indices if index is not None])
+            elif kind == "progress":
+                self.__scan_label.configure(text=value)
+            elif kind == "listed":
+                self.finish_listing(reconcile=False)
+            elif kind == "done":
+                self.finish_library_scan()
+                return
+
+        if not self.__scanner.is_running() and not self.__scanner.has_messages():
+            self.finish_library_scan()
+            return
+
+        self.__frames.call_later("scan", 50, self.poll_library_scan)
+
+    def restore_library(self, directory, files):
+        self.__file_list = files
+        self.__file_indices = {file: index for index, file in enumerate(files)}
+        self.__core.set_library(directory, self.__file_list)
+        self.__file_listbox.set_items(self.__file_list)
+        self.__search_future = self.__indexing.submit(self.restore_library_index, directory, list(files))
+
+        if self.__restore_file in self.__file_indices:
+            self.restore_last_played_file()
+        self.finish_listing(reconcile=True)
+        self.__frames.call_later("loudness", DEFERRED_SCAN_MS, self.finish_library_scan)
+        tracer.add_span("startup.list", STARTUP_TIME, time.perf_counter(), {"files": len(files)})
+
+    def restore_library_index(self, directory, files):
+        self.__metadata.load_directory(directory)
+        self.index_search_texts(files)
+        indices = {os.path.join(directory, file): index for index, file in enumerate(files)}
+        for path in self.__metadata.refresh(list(indices)):
+            self.__search.update(indices[path], self.get_search_text(files[indices[path]]))
+
+    def finish_listing(self, reconcile):
+        self.__starting = False
+
+        if self.__watch_library or reconcile:
+            self.__watcher.start(self.__core.get_directory(), self.__file_list, watch=self.__watch_library)
+            self.__frames.call_later("watch", 500, self.poll_library_watcher)
+
+        if self.__saved_shuffle:
+            self.__core.restore_shuffle(*self.__saved_shuffle)
+        self.__saved_shuffle = None
+
+        if self.__restore_scrollbar_position is not None:
+            self.__file_listbox.yview_moveto(self.__restore_scrollbar_position)
+            self.__restore_scrollbar_position = None
+
+    def save_listing(self):
+        self.__indexing.submit(self.__metadata.put_listing, self.__core.get_directory(), list(self.__file_list))
+
+    def finish_library_scan(self):
+        self.__scan_label.configure(text="")
+        self.refresh_search()
+        self.save_listing()
+        self.__indexing.submit(prune_peaks, self.__peaks_cache_bytes)
+        self.__loudness_scanner.start([self.get_file_path(file) for file in self.__file_list])
+        self.__frames.call_later("loudness", 200, self.poll_loudness_scan)
+
+    def poll_loudness_scan(self):
+        for kind, value in self.__loudness_scanner.get_messages():
+            if kind == "measured":
+                if self.__core.get_current_file() and self.get_file_path(self.__core.get_current_file()) in value:
+                    self.__core.apply_volume()
+            elif kind == "progress":
+                self.__scan_label.configure(text=value)
+            elif kind == "done":
+                self.__scan_label.configure(text="")
+                return
+
+        if not self.__loudness_scanner.is_running() and not self.__loudness_scanner.has_messages():
+            self.__scan_label.configure(text="")
+            return
+
+        self.__frames.call_later("loudness", 200, self.poll_loudness_scan)
+
+    def poll_library_watcher(self):
+        for kind, value in self.__watcher.get_messages():
+            if kind == "changes":
+                self.apply_library_changes(value)
+
+        if self.__watcher.is_running() or self.__watcher.has_messages():
+            self.__frames.call_later("watch", 500, self.poll_library_watcher)
+
+    def apply_library_changes(self, changes):
+        renamed = [(self.__file_indices[old], new) for old, new in changes.renamed if old in self.__file_indices]
+        removed = sorted(self.__file_indices[file] for file in changes.removed if file in self.__file_indices)
+        added = [file for file in changes.added if file not in self.__file_indices]
+        updated = [self.__file_indices[file] for file in changes.changed if file in self.__file_indices]
+        updated.extend(index for index, _ in renamed)
+        if not (renamed or removed or added or updated):
+            return
+
+        for index in updated:
+            self.__decode_pool.discard(self.get_file_path(self.__file_list[index]))
+            remove_peaks(self.get_file_path(self.__file_list[index]))
+        for index in removed:
+            remove_peaks(self.get_file_path(self.__file_list[index]))
+
+        remap = self.__core.update_library(removed, added, renamed)
+        if remap is not None:
+            updated = [remap[index] for index in updated if remap[index] >= 0]
+        self.__file_indices = {file: index for index, file in enumerate(self.__file_list)}
+
+        self.__file_listbox.remap(remap)
+        if self.__core.get_current_index() is not None:
+            self.__file_listbox.select_set(self.__core.get_current_index())
+        self.save_listing()
+
+        paths = [self.get_file_path(file) for file in added] + [self.get_file_path(self.__file_list[index]) for index in updated]
+        self.__search_future = self.__indexing.submit(self.index_library_changes, removed, added, updated, paths)
+        self.refresh_search()
+
+        if added and not self.__loudness_scanner.is_running():
+            self.__loudness_scanner.start(paths[:len(added)])
+            self.__frames.call_later("loudness", 200, self.poll_loudness_scan)
+
+    def index_library_changes(self, removed, added, updated, paths):
+        self.__metadata.refresh(paths)
+        self.__search.remove(removed)
+        self.index_search_texts(added)
+        self.update_search_texts(updated)
+
+    def get_search_text(self, file):
+        info = self.__metadata.get(self.get_file_path(file))
+        return build_search_text(file, info.tags if info is not None else None)
+
+    def index_search_texts(self, files):
+        self.__search.extend([self.get_search_text(file) for file in files])
+
+    def update_search_texts(self, indices):
+        for index in indices:
+            self.__search.update(index, self.get_search_text(self.__file_list[index]))
+
+    def refresh_search(self):
+        if not self.__search_text.get().strip():
+            return
+        if self.__search_future is not None and not self.__search_future.done():
+            self.__frames.call_later("search", 50, self.refresh_search)
         else:
-            self.__directory = self.__last_directory
+            self.__frames.call_later("search", 0, self.apply_search)
 
-        if self.__directory:
-            self.__last_directory = self.__directory
+    def apply_search(self):
+        if self.__search_future is not None and not self.__search_future.done():
+            self.__frames.call_later("search", 50, self.apply_search)
+            return
 
-            if not self.__config.has_section("Settings"):
-                self.__config.add_section("Settings")
+        self.__file_listbox.set_filter(self.__search.search(self.__search_text.get()))
+        if self.__core.get_current_index() is not None:
+            self.__file_listbox.see(self.__core.get_current_index())
 
-            self.__config.set("Settings", "last_directory", self.__last_directory)
-            with open("config.ini", "w", encoding="utf-8") as configfile:
-                self.__config.write(configfile)
-            
-            self.__file_listbox.delete(0, tk.END)
-            self.__file_list = os.listdir(self.__directory)
+    def play_first_search_result(self, event=None):
+        if self.__file_listbox.get_row_count():
+            self.__file_listbox.selection_clear(0, tk.END)
+            self.__file_listbox.select_set(self.__file_listbox.get_item_index(0))
+            self.play_selected_file()
+
+    def restore_last_played_file(self):
+        index = self.__file_list.index(self.__restore_file)
+        self.__restore_file = None
+        self.__file_listbox.select_set(index)
+        self.play_file_at_index(index)
+
+    def wait_for_queue(self):
+        if not self.__queue_future.done():
+            self.__frames.call_later("queue_load", 50, self.wait_for_queue)
+            return
+
+        play_queue = self.__queue_future.result()
+        self.__queue_future = None
+        if len(self.__core.get_queue()):
+            play_queue.enqueue(self.__core.get_queue())
+            self.schedule_queue_save()
+        self.__core.set_queue(play_queue)
+        self.show_queue_length()
 
-        if self.__file_list:
-            for file_name in self.__file_list:
-                self.__file_listbox.insert(tk.END, file_name)
-            self.configure_file_list()
+    def queue_changed(self):
+        self.show_queue_length()
+        self.schedule_queue_save()
+
+    def show_queue_length(self):
+        length = len(self.__core.get_queue())
+        self.__clear_queue_button.configure(text=f"Clear queue ({length})" if length else "Clear queue")
+
+    def schedule_queue_save(self):
+        self.__frames.call_later("queue", QUEUE_SAVE_MS, self.save_queue)
+
+    def save_queue(self):
+        if self.__queue_future is not None:
+            self.schedule_queue_save()
+            return
+        self.__background.submit(self.__core.get_queue().copy().export_m3u, QUEUE_PATH)
+
+    def enqueue_selected(self, event=None, play_next=False):
+        selected_index = self.__file_listbox.curselection()
+        if selected_index:
+            self.__core.enqueue([self.__file_list[index] for index in selected_index], play_next)
+            self.queue_changed()
+
+    def import_playlist(self):
+        path = filedialog.askopenfilename(initialdir=self.__last_directory, filetypes=[("Playlists", "*.m3u *.m3u8")])
+        if not path or self.__import_future is not None:
+            return
+
+        play_queue = PlayQueue()
+        self.__import_future = self.__background.submit(play_queue.import_m3u, path)
+        self.__frames.call_later("import", 50, self.wait_for_import, path, play_queue)
+
+    def wait_for_import(self, path, play_queue):
+        if not self.__import_future.done() or self.__queue_future is not None:
+            self.__frames.call_later("import", 50, self.wait_for_import, path, play_queue)
+            return
+
+        future, self.__import_future = self.__import_future, None
+        if future.exception() is not None:
+            messagebox.showerror("Error", f"Could not read {path}.")
+            return
+        play_queue.prepend_queue(self.__core.get_queue())
+        self.__core.set_queue(play_queue)
+        self.queue_changed()
+
+    def clear_queue(self):
+        self.__core.clear_queue()
+        self.queue_changed()
+
+    def export_queue(self):
+        path = filedialog.asksaveasfilename(initialdir=self.__last_directory, defaultextension=".m3u8",
+                                            filetypes=[("Playlists", "*.m3u8 *.m3u")])
+        if not path:
+            return
+
+        try:
+            self.__core.get_queue().export_m3u(path)
+        except OSError:
+            messagebox.showerror("Error", f"Could not write {path}.")
 
     def edit_files(self):
-        self.__play_button.config(image=self.play_button)
+        if not self.__core.get_current_file():
+            return
+
+        self.__play_button.config(image=self.get_icon("play"))
         self.__play_state["paused"] = True
-        self.__channel_one.pause()
-        self.__channel_two.pause()
-        pygame.mixer.music.pause()
+        self.__core.pause_all()
         
-        audio_file_path = f"{self.__last_directory}/{self.__last_played_file}"
+        audio_file_path = self.get_file_path(self.__core.get_current_file())
+        editor = find_editor(self.__config.get("Settings", "editor", fallback=EDITOR_COMMAND))
 
         try:
-            command = ["audacity", audio_file_path]
-            subprocess.check_call(command, shell=True)
-        except subprocess.CalledProcessError:
+            if editor is None:
+                raise FileNotFoundError(EDITOR_COMMAND)
+            self.__edit_sessions[audio_file_path] = EditSession(editor, audio_file_path)
+        except OSError:
             messagebox.showerror("Error", "Audacity is not installed on your system. Please install Audacity to edit audio files.")
+            return
 
-    def close(self):
-        if self.__last_played_file:
-            scrollbar_position = self.__listbox_scrollbar.get()[0]
-            
-            self.__config.set("Settings", "width", str(self.__root.winfo_width()))
-            self.__config.set("Settings", "height", str(self.__root.winfo_height()))
-            self.__config.set("Settings", "scrollbar_position", str(scrollbar_position))
-            self.__config.set("Settings", "last_played_file", self.__last_played_file)
+        self.__frames.call_later("edit", EDIT_POLL_MS, self.poll_edit_sessions)
+
+    def poll_edit_sessions(self):
+        for path, session in list(self.__edit_sessions.items()):
+            running = session.is_running()
+            previous_stat = session.poll_change()
+            if previous_stat is not None:
+                self.reload_edited_file(path, previous_stat)
+            elif not running and not session.has_pending_change():
+                del self.__edit_sessions[path]
+
+        if self.__edit_sessions:
+            self.__frames.call_later("edit", EDIT_POLL_MS, self.poll_edit_sessions)
+
+    def reload_edited_file(self, path, previous_stat):
+        file = os.path.relpath(path, self.__core.get_directory())
+        is_current = file == self.__core.get_current_file()
+        position = self.__core.get_position() if is_current else 0.0
+
+        remove_peaks(path)
+        self.__core.invalidate_track(file, previous_stat)
+        if file in self.__file_indices:
+            self.__search_future = self.__indexing.submit(self.update_search_texts, [self.__file_indices[file]])
+        if not self.__loudness_scanner.is_running():
+            self.__loudness_scanner.start([path])
+            self.__frames.call_later("loudness", 200, self.poll_loudness_scan)
+
+        if not is_current:
+            return
 
-            with open("config.ini", "w", encoding="utf-8") as configfile:
-                self.__config.write(configfile)
+        self.show_waveform(file)
+        if self.__play_state["paused"]:
+            self.__reload_position = position
+            self.__current_position = position
+            self.update_audio_slider_and_label()
+        else:
+            self.__frames.cancel("tracking")
+            self.play_file(file, position)
 
+    def close(self):
+        self.__session.update(width=self.__root.winfo_width(),
+                              height=self.__root.winfo_height(),
+                              scrollbar_position=self.__listbox_scrollbar.get()[0])
+        self.save_session()
+        self.__session.close()
+        if self.__queue_future is None:
+            try:
+                self.__core.get_queue().export_m3u(QUEUE_PATH)
+            except OSError:
+                pass
+
+        self.__frames.stop()
+        self.__scanner.cancel()
+        self.__loudness_scanner.cancel()
+        self.__watcher.cancel()
+        self.__core.close()
+        self.__decode_pool.shutdown()
+        self.__background.shutdown(wait=False, cancel_futures=True)
+        self.__indexing.shutdown(wait=False, cancel_futures=True)
+        self.__metadata.close()
         self.__root.destroy()
+        tracer.finish()
 
 class HoverButton(tk.Button):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, scheduler=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.bind("<Enter>", self.on_enter)
         self.bind("<Leave>", self.on_leave)
+        self.scheduler = scheduler
         self.transition_duration = 200
-        self.transition_steps = 50
+        self.current_color = None
 
     def on_enter(self, event=None):
         self.transition_to_color("lightblue")
@@ -524,21 +936,29 @@ class HoverButton(tk.Button):
         self.transition_to_color("SystemButtonFace")
 
     def transition_to_color(self, target_color):
-        current_color = self.cget("bg")
+        current_rgb = self.winfo_rgb(self.cget("bg"))
         target_rgb = self.winfo_rgb(target_color)
-        current_rgb = self.winfo_rgb(current_color)
-        step_rgb = [(target - current) / self.transition_steps for target, current in zip(target_rgb, current_rgb)]
-        self.transition_step(current_rgb, step_rgb, 0)
+        self.scheduler.animate(self, partial(self.transition_step, current_rgb, target_rgb, time.perf_counter()))
 
-    def transition_step(self, current_rgb, step_rgb, step):
-        if step >= self.transition_steps:
-            return
-        new_rgb = tuple(int(current + step * step_value) for current, step_value in zip(current_rgb, step_rgb))
-        new_color = "#%02x%02x%02x" % new_rgb
-        self.config(bg=new_color)
-        self.after(self.transition_duration // self.transition_steps, self.transition_step, current_rgb, step_rgb, step + 1)
+    def transition_step(self, current_rgb, target_rgb, started, now):
+        progress = min(1.0, (now - started) * 1000 / self.transition_duration)
+        new_rgb = tuple(int(current + (target - current) * progress) for current, target in zip(current_rgb, target_rgb))
+        new_color = "#%04x%04x%04x" % new_rgb
+        if new_color != self.current_color:
+            self.current_color = new_color
+            self.config(bg=new_color)
+        return progress < 1.0
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", nargs="?", const="1", help="record timing spans and write a Chrome trace to this file on exit")
+    arguments, _ = parser.parse_known_args()
+    configure_tracing(arguments.trace)
+
+    pygame.mixer.pre_init(48000, -16, 2, 2048)
+    pygame.mixer.init()
+
     root = tk.Tk()
     music_player = MusicPlayerWindow(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from mutagen import MutagenError
+from mutagen.mp3 import EasyMP3
+from mutagen.wave import WAVE
+from seek_index import SeekIndex
+from tracing import tracer
+
+AudioInfo = namedtuple("AudioInfo", ["size", "mtime", "duration", "bitrate", "sample_rate", "channels", "tags"])
+Loudness = namedtuple("Loudness", ["size", "mtime", "integrated", "peak"])
+
+WAVE_TAG_FRAMES = {"TIT2": "title", "TPE1": "artist", "TALB": "album", "TCON": "genre", "TDRC": "date", "TRCK": "tracknumber"}
+
+
+def read_tags(audio):
+    tags = {}
+    if not audio.tags:
+        return tags
+
+    if isinstance(audio, WAVE):
+        for frame_id, name in WAVE_TAG_FRAMES.items():
+            frame = audio.tags.get(frame_id)
+            if frame is not None and frame.text:
+                tags[name] = str(frame.text[0])
+    else:
+        for name, values in audio.tags.items():
+            if values:
+                tags[name] = str(values[0])
+    return tags
+
+
+def read_audio_info(path, stat=None):
+    if stat is None:
+        stat = os.stat(path)
+
+    if path.lower().endswith(".mp3"):
+        audio = EasyMP3(path)
+    else:
+        audio = WAVE(path)
+
+    info = audio.info
+    return AudioInfo(stat.st_size, stat.st_mtime_ns, info.length, getattr(info, "bitrate", 0),
+                     info.sample_rate, info.channels, read_tags(audio))
+
+
+class MetadataIndex:
+    def __init__(self, db_path="library.db"):
+        self.__lock = threading.RLock()
+        self.__cache = {}
+        self.__connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS tracks (
+                                         path TEXT PRIMARY KEY,
+                                         size INTEGER NOT NULL,
+                                         mtime INTEGER NOT NULL,
+                                         duration REAL NOT NULL,
+                                         bitrate INTEGER NOT NULL,
+                                         sample_rate INTEGER NOT NULL,
+                                         channels INTEGER NOT NULL,
+                                         tags TEXT NOT NULL)""")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS seek_indexes (
+                                         path TEXT PRIMARY KEY,
+                                         size INTEGER NOT NULL,
+                                         mtime INTEGER NOT NULL,
+                                         sample_rate INTEGER NOT NULL,
+                                         samples_per_entry REAL NOT NULL,
+                                         delay INTEGER NOT NULL,
+                                         exact INTEGER NOT NULL,
+                                         offsets BLOB NOT NULL)""")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS loudness (
+                                         path TEXT PRIMARY KEY,
+                                         size INTEGER NOT NULL,
+                                         mtime INTEGER NOT NULL,
+                                         integrated REAL,
+                                         peak REAL NOT NULL)""")
+        self.__connection.execute("""CREATE TABLE IF NOT EXISTS listings (
+                                         directory TEXT PRIMARY KEY,
+                                         files BLOB NOT NULL)""")
+        self.__connection.commit()
+        self.__seek_indexes = {}
+        self.__loudness = {}
+
+    def get(self, path):
+        return self.__cache.get(path)
+
+    def lookup(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        info = self.get_current(path, stat)
+        if info is None:
+            try:
+                with tracer.span("metadata.parse", path=path):
+                    info = read_audio_info(path, stat)
+            except MutagenError:
+                return None
+            self.put(path, info)
+        return info
+
+    def get_current(self, path, stat):
+        info = self.__cache.get(path)
+        if info is None:
+            info = self.load(path)
+
+        if info is not None and info.size == stat.st_size and info.mtime == stat.st_mtime_ns:
+            self.__cache[path] = info
+            return info
+        return None
+
+    def load(self, path):
+        with self.__lock:
+            row = self.__connection.execute("SELECT size, mtime, duration, bitrate, sample_rate, channels, tags "
+                                            "FROM tracks WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        return AudioInfo(*row[:6], json.loads(row[6]))
+
+    def load_directory(self, directory):
+        prefix = os.path.join(directory, "")
+        with self.__lock:
+            rows = self.__connection.execute("SELECT path, size, mtime, duration, bitrate, sample_rate, channels, tags "
+                                             "FROM tracks WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+        for row in rows:
+            self.__cache[row[0]] = AudioInfo(*row[1:7], json.loads(row[7]))
+
+        with self.__lock:
+            loudness_rows = self.__connection.execute("SELECT path, size, mtime, integrated, peak FROM loudness "
+                                                      "WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)).fetchall()
+        for row in loudness_rows:
+            self.__loudness[row[0]] = Loudness(*row[1:])
+        return len(rows)
+
+    def put(self, path, info):
+        self.put_many([(path, info)])
+
+    def put_many(self, items):
+        with self.__lock:
+            self.__connection.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                          [(path, info.size, info.mtime, info.duration, info.bitrate,
+                                            info.sample_rate, info.channels, json.dumps(info.tags))
+                                           for path, info in items])
+            self.__connection.commit()
+        for path, info in items:
+            self.__cache[path] = info
+
+    def refresh(self, paths):
+        changed = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.get_current(path, stat) is None:
+                try:
+                    changed.append((path, read_audio_info(path, stat)))
+                except MutagenError:
+                    continue
+        if changed:
+            self.put_many(changed)
+        return [path for path, _ in changed]
+
+    def get_seek_index(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        cached = self.__seek_indexes.get(path)
+        if cached is None:
+            with self.__lock:
+                row = self.__connection.execute("SELECT size, mtime, sample_rate, samples_per_entry, offsets, delay, exact "
+                                                "FROM seek_indexes WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return None
+            cached = (row[0], row[1], SeekIndex.from_bytes(*row[2:]))
+
+        size, mtime, seek_index = cached
+        if size != stat.st_size or mtime != stat.st_mtime_ns:
+            return None
+        self.__seek_indexes[path] = cached
+        return seek_index
+
+    def put_seek_index(self, path, stat, seek_index):
+        with self.__lock:
+            self.__connection.execute("INSERT OR REPLACE INTO seek_indexes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                      (path, stat.st_size, stat.st_mtime_ns, seek_index.sample_rate,
+                                       seek_index.samples_per_entry, seek_index.delay, int(seek_index.exact),
+                                       seek_index.get_offsets_bytes()))
+            self.__connection.commit()
+        self.__seek_indexes[path] = (stat.st_size, stat.st_mtime_ns, seek_index)
+
+    def get_loudness(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return self.get_current_loudness(path, stat)
+
+    def get_current_loudness(self, path, stat):
+        loudness = self.__loudness.get(path)
+        if loudness is None:
+            with self.__lock:
+                row = self.__connection.execute("SELECT size, mtime, integrated, peak FROM loudness WHERE path = ?",
+                                                (path,)).fetchone()
+            if row is None:
+                return None
+            loudness = Loudness(*row)
+
+        if loudness.size != stat.st_size or loudness.mtime != stat.st_mtime_ns:
+            return None
+        self.__loudness[path] = loudness
+        return loudness
+
+    def put_loudness_many(self, items):
+        with self.__lock:
+            self.__connection.executemany("INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?)",
+                                          [(path, loudness.size, loudness.mtime, loudness.integrated, loudness.peak)
+                                           for path, loudness in items])
+            self.__connection.commit()
+        for path, loudness in items:
+            self.__loudness[path] = loudness
+
+    def get_listing(self, directory):
+        with self.__lock:
+            row = self.__connection.execute("SELECT files FROM listings WHERE directory = ?", (directory,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        return bytes(row[0]).decode("utf-8", "surrogateescape").split("\0")
+
+    def put_listing(self, directory, files):
+        data = "\0".join(files).encode("utf-8", "surrogateescape")
+        with self.__lock:
+            self.__connection.execute("INSERT OR REPLACE INTO listings VALUES (?, ?)", (directory, data))
+            self.__connection.commit()
+
+    def invalidate(self, path):
+        self.__cache.pop(path, None)
+        self.__seek_indexes.pop(path, None)
+        self.__loudness.pop(path, None)
+        with self.__lock:
+            self.__connection.execute("DELETE FROM tracks WHERE path = ?", (path,))
+            self.__connection.execute("DELETE FROM seek_indexes WHERE path = ?", (path,))
+            self.__connection.execute("DELETE FROM loudness WHERE path = ?", (path,))
+            self.__connection.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
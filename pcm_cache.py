@@ -0,0 +1,161 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+import pygame
+from tracing import tracer
+
+PCM_CACHE_DIR = "pcm_cache"
+
+
+def get_pcm_cache_name(path, stat, mixer_format):
+    frequency, size, channels = mixer_format
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{frequency}|{size}|{channels}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pcm"
+
+
+def get_frame_size():
+    _, size, channels = pygame.mixer.get_init()
+    return abs(size) // 8 * channels
+
+
+class MappedPcmReader:
+    def __init__(self, mapped, offset=0):
+        self.__map = mapped
+        self.__offset = offset
+        self.__frame_size = get_frame_size()
+
+    def read(self, frames):
+        data = self.__map[self.__offset:self.__offset + frames * self.__frame_size]
+        self.__offset += len(data)
+        return data
+
+    def close(self):
+        self.__map.close()
+
+
+class PcmDiskCache:
+    def __init__(self, max_bytes, directory=PCM_CACHE_DIR):
+        self.__max_bytes = max_bytes
+        self.__directory = directory
+        self.__entries = OrderedDict()
+        self.__total_bytes = 0
+        self.__lock = threading.Lock()
+        self.load_entries()
+
+    def load_entries(self):
+        os.makedirs(self.__directory, exist_ok=True)
+        entries = []
+        with os.scandir(self.__directory) as iterator:
+            for entry in iterator:
+                try:
+                    if entry.name.endswith(".pcm"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+                    elif entry.name.endswith(".tmp"):
+                        os.remove(entry.path)
+                except OSError:
+                    continue
+
+        with self.__lock:
+            for _, name, size in sorted(entries):
+                self.__entries[name] = size
+                self.__total_bytes += size
+            self.evict()
+
+    def get_entry_name(self, path):
+        try:
+            return get_pcm_cache_name(path, os.stat(path), pygame.mixer.get_init())
+        except OSError:
+            return None
+
+    def contains(self, path):
+        name = self.get_entry_name(path)
+        with self.__lock:
+            return name in self.__entries
+
+    def open_map(self, path):
+        name = self.get_entry_name(path)
+        with self.__lock:
+            if name not in self.__entries:
+                return None
+            self.__entries.move_to_end(name)
+
+        entry_path = os.path.join(self.__directory, name)
+        try:
+            with open(entry_path, "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            with self.__lock:
+                self.__total_bytes -= self.__entries.pop(name, 0)
+            return None
+        return mapped
+
+    def load_sound(self, path):
+        with tracer.span("pcm_cache.load", path=path):
+            mapped = self.open_map(path)
+            if mapped is None:
+                return None
+            try:
+                return pygame.mixer.Sound(buffer=mapped)
+            finally:
+                mapped.close()
+
+    def open_reader(self, path, start=0.0):
+        mapped = self.open_map(path)
+        if mapped is None:
+            return None
+        frame_size = get_frame_size()
+        offset = min(int(start * pygame.mixer.get_init()[0]) * frame_size, len(mapped) - len(mapped) % frame_size)
+        return MappedPcmReader(mapped, offset)
+
+    def put(self, path, sound):
+        name = self.get_entry_name(path)
+        data = memoryview(sound).cast("B")
+        if name is None or not len(data) or len(data) > self.__max_bytes:
+            return
+        with self.__lock:
+            if name in self.__entries:
+                return
+
+        entry_path = os.path.join(self.__directory, name)
+        temporary_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with tracer.span("pcm_cache.write", path=path):
+                with open(temporary_path, "wb") as file:
+                    file.write(data)
+                os.replace(temporary_path, entry_path)
+        except OSError:
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            return
+
+        with self.__lock:
+            if name not in self.__entries:
+                self.__entries[name] = len(data)
+                self.__total_bytes += len(data)
+            self.evict()
+
+    def discard(self, path, stat):
+        name = get_pcm_cache_name(path, stat, pygame.mixer.get_init())
+        with self.__lock:
+            if name not in self.__entries:
+                return
+            self.__total_bytes -= self.__entries.pop(name)
+        try:
+            os.remove(os.path.join(self.__directory, name))
+        except OSError:
+            pass
+
+    def evict(self):
+        while self.__total_bytes > self.__max_bytes and self.__entries:
+            name, size = self.__entries.popitem(last=False)
+            self.__total_bytes -= size
+            try:
+                os.remove(os.path.join(self.__directory, name))
+            except OSError:
+                pass
@@ -0,0 +1,244 @@
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from tracing import tracer
+
+QUEUE_PATH = "queue.m3u8"
+CHUNK_SIZE = 1024
+IMPORT_BATCH_SIZE = 4096
+SUPPORTED_EXTENSIONS = (b".mp3", b".wav")
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def encode_path(path):
+    return path.encode("utf-8", "surrogateescape")
+
+
+def decode_path(data):
+    return data.decode("utf-8", "surrogateescape")
+
+
+class PathTable:
+    def __init__(self):
+        self.__data = bytearray()
+        self.__offsets = array("Q", [0])
+        self.__ids = {}
+        self.__collisions = {}
+
+    def __len__(self):
+        return len(self.__offsets) - 1
+
+    def get_bytes(self, path_id):
+        return self.__data[self.__offsets[path_id]:self.__offsets[path_id + 1]]
+
+    def get(self, path_id):
+        return decode_path(self.get_bytes(path_id))
+
+    def add(self, data):
+        self.__data += data
+        self.__offsets.append(len(self.__data))
+        return len(self.__offsets) - 2
+
+    def intern(self, data):
+        key = hash(data)
+        path_id = self.__ids.get(key)
+        if path_id is None:
+            self.__ids[key] = path_id = self.add(data)
+            return path_id
+        if self.get_bytes(path_id) == data:
+            return path_id
+
+        path_id = self.__collisions.get(data)
+        if path_id is None:
+            self.__collisions[bytes(data)] = path_id = self.add(data)
+        return path_id
+
+
+class IdList:
+    def __init__(self, chunks=None):
+        self.__chunks = chunks if chunks is not None else []
+        self.__starts = None
+        self.__length = sum(len(chunk) for chunk in self.__chunks)
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self):
+        for chunk in self.__chunks:
+            yield from chunk
+
+    def __getitem__(self, index):
+        chunk, offset = self.locate(index)
+        return self.__chunks[chunk][offset]
+
+    def get_chunks(self):
+        return self.__chunks
+
+    def copy(self):
+        return IdList([array("I", chunk) for chunk in self.__chunks])
+
+    def locate(self, index):
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError(index)
+        if index < len(self.__chunks[0]):
+            return 0, index
+
+        if self.__starts is None:
+            self.__starts = array("Q", accumulate((len(chunk) for chunk in self.__chunks), initial=0))
+        chunk = bisect_right(self.__starts, index) - 1
+        return chunk, index - self.__starts[chunk]
+
+    def extend(self, ids):
+        start = 0
+        if self.__chunks and len(self.__chunks[-1]) < CHUNK_SIZE:
+            start = CHUNK_SIZE - len(self.__chunks[-1])
+            self.__chunks[-1].extend(ids[:start])
+        for offset in range(start, len(ids), CHUNK_SIZE):
+            self.__chunks.append(array("I", ids[offset:offset + CHUNK_SIZE]))
+        self.__length += len(ids)
+        self.__starts = None
+
+    def prepend(self, ids):
+        self.__chunks[:0] = [array("I", ids[offset:offset + CHUNK_SIZE]) for offset in range(0, len(ids), CHUNK_SIZE)]
+        self.__length += len(ids)
+        self.__starts = None
+
+    def insert(self, index, path_id):
+        if index >= self.__length:
+            self.extend((path_id,))
+            return
+
+        chunk, offset = self.locate(max(0, index))
+        self.__chunks[chunk].insert(offset, path_id)
+        if len(self.__chunks[chunk]) > CHUNK_SIZE * 2:
+            self.__chunks[chunk:chunk + 1] = [self.__chunks[chunk][:CHUNK_SIZE], self.__chunks[chunk][CHUNK_SIZE:]]
+        self.__length += 1
+        self.__starts = None
+
+    def pop(self, index=-1):
+        chunk, offset = self.locate(index)
+        path_id = self.__chunks[chunk].pop(offset)
+        if not self.__chunks[chunk]:
+            del self.__chunks[chunk]
+        self.__length -= 1
+        self.__starts = None
+        return path_id
+
+    def clear(self):
+        self.__chunks = []
+        self.__length = 0
+        self.__starts = None
+
+
+class PlayQueue:
+    def __init__(self, paths=None, entries=None):
+        self.__paths = paths if paths is not None else PathTable()
+        self.__entries = entries if entries is not None else IdList()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __getitem__(self, index):
+        return self.__paths.get(self.__entries[index])
+
+    def __iter__(self):
+        for path_id in self.__entries:
+            yield self.__paths.get(path_id)
+
+    def copy(self):
+        return PlayQueue(self.__paths, self.__entries.copy())
+
+    def get_path_bytes(self):
+        for path_id in self.__entries:
+            yield self.__paths.get_bytes(path_id)
+
+    def prepend_queue(self, other):
+        self.__entries.prepend(array("I", (self.__paths.intern(bytes(data)) for data in other.get_path_bytes())))
+
+    def enqueue(self, paths):
+        self.__entries.extend(array("I", (self.__paths.intern(encode_path(path)) for path in paths)))
+
+    def play_next(self, paths):
+        for index, path in enumerate(paths):
+            self.__entries.insert(index, self.__paths.intern(encode_path(path)))
+
+    def move(self, index, new_index):
+        self.__entries.insert(new_index, self.__entries.pop(index))
+
+    def remove(self, index):
+        return self.__paths.get(self.__entries.pop(index))
+
+    def clear(self):
+        self.__entries.clear()
+
+    def peek(self):
+        if not self.__entries:
+            return None
+        return self.__paths.get(self.__entries[0])
+
+    def pop_next(self):
+        if not self.__entries:
+            return None
+        return self.__paths.get(self.__entries.pop(0))
+
+    def import_m3u(self, path):
+        with tracer.span("queue.import", path=path):
+            return self.read_m3u(path)
+
+    def read_m3u(self, path):
+        base = encode_path(os.path.dirname(os.path.abspath(path)))
+        legacy = not path.lower().endswith(".m3u8")
+        intern = self.__paths.intern
+        batch = array("I")
+        count = 0
+
+        with open(path, "rb") as file:
+            for line in file:
+                line = line.strip()
+                if line.startswith(UTF8_BOM):
+                    line = line[len(UTF8_BOM):]
+                if not line or line.startswith(b"#"):
+                    continue
+                if b"://" in line or not line.lower().endswith(SUPPORTED_EXTENSIONS):
+                    continue
+                if legacy:
+                    try:
+                        line.decode("utf-8")
+                    except UnicodeDecodeError:
+                        line = encode_path(line.decode("cp1252", "replace"))
+                line = os.path.normpath(line if os.path.isabs(line) else os.path.join(base, line))
+
+                batch.append(intern(line))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    self.__entries.extend(batch)
+                    count += len(batch)
+                    batch = array("I")
+
+        self.__entries.extend(batch)
+        return count + len(batch)
+
+    def export_m3u(self, path):
+        with tracer.span("queue.export", path=path, entries=len(self.__entries)):
+            self.write_m3u(path)
+
+    def write_m3u(self, path):
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        get_bytes = self.__paths.get_bytes
+        with open(temporary_path, "wb") as file:
+            file.write(b"#EXTM3U\n")
+            for chunk in self.__entries.get_chunks():
+                file.write(b"".join(get_bytes(path_id) + b"\n" for path_id in chunk))
+        os.replace(temporary_path, path)
+
+
+def load_queue(path=QUEUE_PATH):
+    play_queue = PlayQueue()
+    try:
+        play_queue.import_m3u(path)
+    except OSError:
+        pass
+    return play_queue
@@ -0,0 +1,25 @@
+import time
+
+
+class PlaybackClock:
+    def __init__(self, position=0.0):
+        self.__base = position
+        self.__started = None
+
+    def start(self, position=0.0):
+        self.__base = position
+        self.__started = time.perf_counter()
+
+    def pause(self):
+        if self.__started is not None:
+            self.__base += time.perf_counter() - self.__started
+            self.__started = None
+
+    def resume(self):
+        if self.__started is None:
+            self.__started = time.perf_counter()
+
+    def get_position(self):
+        if self.__started is None:
+            return self.__base
+        return self.__base + time.perf_counter() - self.__started
@@ -0,0 +1,522 @@
+import os
+import time
+import pygame
+from decoding import SoundPcmReader
+from loudness import get_gain_factor
+from play_queue import PlayQueue
+from playback_clock import PlaybackClock
+from seek_index import load_or_build_seek_index
+from shuffle import ShuffleOrder
+from streaming import StreamingChannel, open_pcm_reader
+from tracing import tracer
+from transitions import TransitionScheduler
+
+TRANSITION_LEAD_SECONDS = 2.0
+
+
+class PlayerCore:
+    def __init__(self, metadata, decode_pool, background, streaming=False, crossfade_seconds=0.0, loudness_target=-18.0):
+        self.__metadata = metadata
+        self.__decode_pool = decode_pool
+        self.__background = background
+        self.__streaming = streaming
+        self.__loudness_target = loudness_target
+
+        self.__directory = None
+        self.__file_list = []
+        self.__current_index = None
+        self.__current_file = None
+
+        self.__channel_one_or_two = False
+        self.__channel_one = pygame.mixer.Channel(0)
+        self.__channel_two = pygame.mixer.Channel(1)
+        self.__active_stream = None
+        self.__pending_file = None
+        self.__pending_future = None
+        self.__pending_position = 0.0
+        self.__seek_future = None
+
+        self.__shuffle_order = ShuffleOrder()
+        self.__queue = PlayQueue()
+        self.__transitions = TransitionScheduler(crossfade_seconds)
+        self.__track_ended_at = None
+        self.__clock = PlaybackClock()
+        self.__total_duration = 0
+        self.__volume = 1
+        self.__play_state = {"paused": True,
+                             "repeating": False,
+                             "shuffle": False,
+                             "muted": False}
+
+    def get_play_state(self):
+        return self.__play_state
+
+    def set_play_state(self, key, value):
+        self.__play_state[key] = value
+        if key == "shuffle" and value and self.__file_list:
+            self.__shuffle_order.ensure(len(self.__file_list), self.__current_index)
+        if key in ("shuffle", "repeating"):
+            self.prefetch_adjacent_tracks()
+
+    def set_library(self, directory, file_list):
+        self.__directory = directory
+        self.__file_list = file_list
+
+    def get_directory(self):
+        return self.__directory
+
+    def get_file_list(self):
+        return self.__file_list
+
+    def get_file_path(self, file):
+        if self.__directory is None:
+            return file
+        return os.path.join(self.__directory, file)
+
+    def get_library_file(self, path):
+        if self.__directory and path.startswith(os.path.join(self.__directory, "")):
+            return os.path.relpath(path, self.__directory)
+        return path
+
+    def get_queue(self):
+        return self.__queue
+
+    def set_queue(self, play_queue):
+        self.__queue = play_queue
+        self.prefetch_adjacent_tracks()
+
+    def enqueue(self, files, play_next=False):
+        paths = [os.path.abspath(self.get_file_path(file)) for file in files]
+        if play_next:
+            self.__queue.play_next(paths)
+        else:
+            self.__queue.enqueue(paths)
+        self.prefetch_adjacent_tracks()
+
+    def clear_queue(self):
+        self.__queue.clear()
+        self.prefetch_adjacent_tracks()
+
+    def get_current_index(self):
+        return self.__current_index
+
+    def get_current_file(self):
+        return self.__current_file
+
+    def set_current_file(self, file):
+        self.__current_file = file
+
+    def select_index(self, index):
+        self.__current_index = index
+        self.__current_file = self.__file_list[index]
+        if self.__play_state["shuffle"]:
+            self.__shuffle_order.ensure(len(self.__file_list), index)
+
+    def get_pending_file(self):
+        return self.__pending_file
+
+    def get_shuffle_state(self):
+        if not len(self.__shuffle_order):
+            return None
+        return (len(self.__shuffle_order), self.__shuffle_order.get_seed(), self.__shuffle_order.get_cursor(),
+                self.__shuffle_order.get_order_text())
+
+    def restore_shuffle(self, size, seed, cursor, order_text=None):
+        if size != len(self.__file_list):
+            return
+        if not isinstance(order_text, str) or not self.__shuffle_order.restore(size, seed, cursor, order_text):
+            self.__shuffle_order.reset(size, seed, cursor)
+
+    def get_gap_timings(self):
+        return self.__transitions.get_gap_timings()
+
+    def play_file(self, file, position=0.0):
+        self.__current_file = file
+        self.__pending_file = file
+        self.__pending_future = None
+        self.__pending_position = position
+        path = self.get_file_path(file)
+
+        if self.__streaming:
+            try:
+                reader = self.open_reader(path, position)
+            except (pygame.error, OSError):
+                self.__pending_file = None
+                raise
+            if reader is not None:
+                return self.switch_channel(file, reader, position)
+        elif self.__decode_pool.get_cached(path) is None:
+            reader = self.__decode_pool.open_cached_reader(path, position)
+            if reader is not None:
+                return self.switch_channel(file, reader, position)
+
+        self.__pending_future = self.__decode_pool.request(path)
+        return self.poll_pending()
+
+    def poll_pending(self):
+        if self.__pending_future is None or not self.__pending_future.done():
+            return None
+
+        file, future = self.__pending_file, self.__pending_future
+        self.__pending_future = None
+        try:
+            sound = future.result()
+        except (pygame.error, OSError):
+            self.__pending_file = None
+            raise
+        if self.__pending_position:
+            return self.switch_channel(file, SoundPcmReader(sound, self.__pending_position), self.__pending_position)
+        return self.switch_channel(file, sound)
+
+    def switch_channel(self, file, source, position=0.0):
+        with tracer.span("track.switch", file=file):
+            return self.start_channel(file, source, position)
+
+    def start_channel(self, file, source, position=0.0):
+        self.__pending_file = None
+        self.__pending_future = None
+        self.cancel_transition()
+
+        if self.__active_stream is not None:
+            self.__active_stream.stop()
+            self.__active_stream = None
+
+        if self.__channel_one_or_two:
+            self.__channel_one_or_two = False
+            self.__channel_one.stop()
+            playing = self.play_on_channel(self.__channel_two, source, position)
+        else:
+            self.__channel_one_or_two = True
+            self.__channel_two.stop()
+            playing = self.play_on_channel(self.__channel_one, source, position)
+
+        self.__current_file = file
+        self.__clock.start(position)
+        self.apply_volume()
+        if self.__track_ended_at is not None:
+            self.__transitions.record_gap(time.perf_counter() - self.__track_ended_at)
+            self.__track_ended_at = None
+
+        self.prepare_track(file)
+        return playing
+
+    def prepare_track(self, file):
+        self.__metadata.lookup(self.get_file_path(file))
+        self.refresh_total_duration()
+        self.prefetch_adjacent_tracks()
+
+        if self.__active_stream is not None and file.lower().endswith(".mp3"):
+            self.__background.submit(load_or_build_seek_index, self.__metadata, self.get_file_path(file))
+
+    def open_reader(self, path, position=0.0):
+        sound = self.__decode_pool.get_cached(path)
+        if sound is not None:
+            return SoundPcmReader(sound, position)
+        reader = self.__decode_pool.open_cached_reader(path, position)
+        if reader is None:
+            reader = open_pcm_reader(path, position, self.__metadata.get_seek_index(path) if position else None)
+        return reader
+
+    def play_on_channel(self, channel, source, position=0.0):
+        if isinstance(source, pygame.mixer.Sound):
+            channel.queue(source)
+            channel.set_endevent(0)
+            return channel
+
+        channel.set_endevent(0)
+        self.__active_stream = StreamingChannel(channel, source, position)
+        self.__active_stream.start()
+        return self.__active_stream
+
+    def get_playing(self):
+        if self.__active_stream is not None:
+            return self.__active_stream
+        return self.__channel_one if self.__channel_one_or_two else self.__channel_two
+
+    def is_streaming(self):
+        return self.__active_stream is not None
+
+    def get_decoded_sound(self, file):
+        return self.__decode_pool.get_cached(self.get_file_path(file))
+
+    def get_position(self):
+        if self.__active_stream is not None:
+            position = self.__active_stream.get_position()
+        else:
+            position = self.__clock.get_position()
+        return min(position, self.__total_duration) if self.__total_duration else position
+
+    def get_total_duration(self):
+        return self.__total_duration
+
+    def refresh_total_duration(self):
+        if not self.__current_file:
+            return None
+        path = self.get_file_path(self.__current_file)
+        audio_info = self.__metadata.get(path) or self.__metadata.lookup(path)
+        if audio_info is None:
+            return None
+        self.__total_duration = audio_info.duration
+        return audio_info.duration
+
+    def get_remaining_time(self):
+        return self.__total_duration - self.get_position()
+
+    def pause(self):
+        self.get_playing().pause()
+        self.__clock.pause()
+
+    def resume(self):
+        self.get_playing().unpause()
+        self.__clock.resume()
+
+    def pause_all(self):
+        self.__channel_one.pause()
+        self.__channel_two.pause()
+        if self.__active_stream is not None:
+            self.__active_stream.pause()
+        self.__clock.pause()
+
+    def mark_track_ended(self):
+        self.__track_ended_at = time.perf_counter()
+
+    def seek(self, position):
+        with tracer.span("seek", position=position):
+            return self.seek_channel(position)
+
+    def seek_channel(self, position):
+        self.cancel_transition()
+        path = self.get_file_path(self.__current_file)
+        channel = self.__channel_one if self.__channel_one_or_two else self.__channel_two
+
+        if self.__active_stream is not None:
+            self.__active_stream.stop()
+            self.__active_stream = None
+
+            reader = self.open_reader(path, position)
+            if reader is not None:
+                return self.play_on_channel(channel, reader, position)
+        elif self.__decode_pool.get_cached(path) is None:
+            reader = self.__decode_pool.open_cached_reader(path, position)
+            if reader is not None:
+                channel.stop()
+                return self.play_on_channel(channel, reader, position)
+
+        self.__seek_future = self.__decode_pool.request(path)
+        if not self.__seek_future.done():
+            return None
+
+        channel.stop()
+        self.__clock.start(position)
+        return self.play_on_channel(channel, SoundPcmReader(self.__seek_future.result(), position), position)
+
+    def is_seek_pending(self):
+        return self.__seek_future is not None and not self.__seek_future.done()
+
+    def get_next_index(self):
+        if not self.__file_list or self.__current_index is None:
+            return None
+
+        if self.__play_state["repeating"]:
+            return self.__current_index
+        if self.__play_state["shuffle"]:
+            self.__shuffle_order.ensure(len(self.__file_list), self.__current_index)
+            return self.__shuffle_order.peek_next()
+        return (self.__current_index + 1) % len(self.__file_list)
+
+    def get_previous_index(self):
+        if not self.__file_list or self.__current_index is None:
+            return None
+
+        if self.__play_state["shuffle"]:
+            self.__shuffle_order.ensure(len(self.__file_list), self.__current_index)
+            return self.__shuffle_order.peek_previous()
+        return (self.__current_index - 1) % len(self.__file_list)
+
+    def get_next_track(self):
+        if len(self.__queue) and not self.__play_state["repeating"]:
+            return None, self.get_library_file(self.__queue.peek())
+
+        next_index = self.get_next_index()
+        if next_index is None:
+            return None
+        return next_index, self.__file_list[next_index]
+
+    def move_to_track(self, track):
+        index, file = track
+        if index is None:
+            if len(self.__queue) and self.get_library_file(self.__queue.peek()) == file:
+                self.__queue.pop_next()
+        else:
+            if self.__play_state["shuffle"] and not self.__play_state["repeating"]:
+                self.__shuffle_order.advance()
+            self.__current_index = index
+        self.__current_file = file
+
+    def move_to_next(self):
+        track = self.get_next_track()
+        if track is None:
+            return None
+
+        self.move_to_track(track)
+        return self.__current_file
+
+    def move_to_previous(self):
+        if self.get_position() < 3:
+            previous_index = self.get_previous_index()
+            if previous_index is None:
+                return None
+            if self.__play_state["shuffle"]:
+                self.__shuffle_order.retreat()
+
+            self.__current_index = previous_index
+            self.__current_file = self.__file_list[previous_index]
+        return self.__current_file
+
+    def prefetch_adjacent_tracks(self):
+        if self.__streaming:
+            return
+
+        track = self.get_next_track()
+        if track is not None:
+            self.__decode_pool.prefetch(self.get_file_path(track[1]))
+
+        previous_index = self.get_previous_index()
+        if previous_index is not None:
+            self.__decode_pool.prefetch(self.get_file_path(self.__file_list[previous_index]))
+
+    def cancel_transition(self):
+        started = self.__transitions.cancel()
+        if self.__active_stream is not None:
+            self.__active_stream.unchain()
+        if started is not None and started[1] is not self.get_playing():
+            started[1].stop()
+
+    def schedule_next_transition(self):
+        if self.__transitions.is_scheduled() or not self.__total_duration:
+            return
+        if self.get_remaining_time() > self.__transitions.get_crossfade() + TRANSITION_LEAD_SECONDS:
+            return
+
+        track = self.get_next_track()
+        if track is None:
+            return
+        path = self.get_file_path(track[1])
+        volume = self.get_track_volume(track[1])
+        other_channel = self.__channel_two if self.__channel_one_or_two else self.__channel_one
+
+        if self.__active_stream is not None:
+            reader = self.open_reader(path)
+            if reader is None:
+                self.__decode_pool.prefetch(path)
+                return
+            if self.__transitions.get_crossfade():
+                upcoming = StreamingChannel(other_channel, reader)
+                self.__transitions.schedule_crossfade(track, self.__active_stream, upcoming, upcoming.start,
+                                                      self.get_remaining_time, volume, reader.close)
+            else:
+                self.__transitions.schedule_stream(track, self.__active_stream, reader)
+            return
+
+        sound = self.__decode_pool.get_cached(path)
+        if sound is None:
+            self.__decode_pool.request(path)
+        elif self.__transitions.get_crossfade():
+            self.__transitions.schedule_crossfade(track, self.get_playing(), other_channel,
+                                                  lambda: other_channel.queue(sound), self.get_remaining_time, volume)
+        else:
+            self.__transitions.schedule_gapless(track, self.get_playing(), sound, self.get_remaining_time)
+
+    def commit_started_transition(self):
+        started = self.__transitions.pop_started()
+        if started is None:
+            return None
+
+        track, playing, started_at = started
+        if playing is not self.get_playing():
+            self.__channel_one_or_two = not self.__channel_one_or_two
+            if self.__active_stream is not None:
+                self.__active_stream = playing
+
+        self.move_to_track(track)
+        self.__clock.start(time.perf_counter() - started_at)
+        if not self.__transitions.get_crossfade():
+            self.apply_volume()
+        self.prepare_track(self.__current_file)
+        return playing
+
+    def set_volume(self, volume):
+        self.__volume = volume
+        self.apply_volume()
+
+    def set_muted(self, muted):
+        self.__play_state["muted"] = muted
+        self.apply_volume()
+
+    def get_track_volume(self, file):
+        if self.__play_state["muted"]:
+            return 0
+        loudness = self.__metadata.get_loudness(self.get_file_path(file))
+        return self.__volume * get_gain_factor(loudness, self.__loudness_target)
+
+    def apply_volume(self):
+        volume = 0 if self.__play_state["muted"] else self.__volume
+        self.__channel_one.set_volume(volume)
+        self.__channel_two.set_volume(volume)
+        if self.__current_file and self.__directory:
+            self.get_playing().set_volume(self.get_track_volume(self.__current_file))
+
+    def update_library(self, removed, added, renamed):
+        for index, file in renamed:
+            if index == self.__current_index:
+                self.__current_file = file
+            self.__file_list[index] = file
+
+        remap = None
+        if removed:
+            removed = set(removed)
+            remap = []
+            files = []
+            for index, file in enumerate(self.__file_list):
+                if index in removed:
+                    remap.append(-1)
+                else:
+                    remap.append(len(files))
+                    files.append(file)
+            self.__file_list[:] = files
+            self.cancel_transition()
+
+        self.__file_list.extend(added)
+        if len(self.__shuffle_order) and (remap is not None or added):
+            self.__shuffle_order.update(remap, len(self.__file_list))
+        if remap is not None and self.__current_index is not None:
+            self.__current_index = self.get_surviving_index(remap, self.__current_index)
+        self.prefetch_adjacent_tracks()
+        return remap
+
+    def get_surviving_index(self, remap, index):
+        if remap[index] >= 0:
+            return remap[index]
+        if not self.__file_list:
+            return None
+        if self.__play_state["shuffle"] and len(self.__shuffle_order):
+            return self.__shuffle_order.current()
+
+        for previous_index in range(index - 1, -1, -1):
+            if remap[previous_index] >= 0:
+                return remap[previous_index]
+        return len(self.__file_list) - 1
+
+    def invalidate_track(self, file, previous_stat=None):
+        path = self.get_file_path(file)
+        self.cancel_transition()
+        self.__decode_pool.discard(path, previous_stat)
+        self.__metadata.invalidate(path)
+        self.__metadata.lookup(path)
+        if file == self.__current_file:
+            self.refresh_total_duration()
+
+    def close(self):
+        self.cancel_transition()
+        if self.__active_stream is not None:
+            self.__active_stream.stop()
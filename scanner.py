@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from mutagen import MutagenError
+from background_task import BackgroundTask
+from metadata import read_audio_info
+from tracing import tracer
+
+SUPPORTED_EXTENSIONS = (".mp3", ".wav")
+
+
+def is_supported_file(file):
+    return file.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def walk_audio_files(directory):
+    stack = [directory]
+    while stack:
+        current_directory = stack.pop()
+        try:
+            with os.scandir(current_directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name.lower())
+        except OSError:
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif is_supported_file(entry.name):
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+        stack.extend(reversed(subdirectories))
+
+
+def read_audio_info_or_none(path):
+    try:
+        return path, read_audio_info(path)
+    except (MutagenError, OSError):
+        return path, None
+
+
+class LibraryScanner(BackgroundTask):
+    def __init__(self, metadata, batch_size=500, parse_chunk_size=64):
+        super().__init__()
+        self.__metadata = metadata
+        self.__batch_size = batch_size
+        self.__parse_chunk_size = parse_chunk_size
+
+    def start(self, directory):
+        self.start_thread(directory)
+
+    def iter_batches(self, directory, stale_paths, cancelled):
+        batch = []
+        for path, stat in walk_audio_files(directory):
+            if cancelled.is_set():
+                return
+
+            batch.append(os.path.relpath(path, directory))
+            if self.__metadata.get_current(path, stat) is None:
+                stale_paths.append(path)
+
+            if len(batch) >= self.__batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run(self, directory, messages, cancelled):
+        self.__metadata.load_directory(directory)
+
+        stale_paths = []
+        found = 0
+        with tracer.span("scan.list", directory=directory):
+            for batch in self.iter_batches(directory, stale_paths, cancelled):
+                found += len(batch)
+                messages.put(("files", batch))
+                messages.put(("progress", f"Scanning... {found} files"))
+
+        if cancelled.is_set():
+            return
+        messages.put(("listed", found))
+
+        if stale_paths:
+            with tracer.span("scan.parse", files=len(stale_paths)):
+                self.parse_metadata(stale_paths, messages, cancelled)
+
+        if not cancelled.is_set():
+            messages.put(("done", found))
+
+    def parse_metadata(self, paths, messages, cancelled):
+        parsed = []
+        with ProcessPoolExecutor() as executor:
+            results = executor.map(read_audio_info_or_none, paths, chunksize=self.__parse_chunk_size)
+            for done, (path, info) in enumerate(results, start=1):
+                if cancelled.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+
+                if info is not None:
+                    parsed.append((path, info))
+                if len(parsed) >= self.__batch_size or done == len(paths):
+                    self.__metadata.put_many(parsed)
+                    messages.put(("tagged", [path for path, _ in parsed]))
+                    parsed = []
+                    messages.put(("progress", f"Reading tags... {done}/{len(paths)}"))
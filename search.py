@@ -0,0 +1,118 @@
+import threading
+from array import array
+from bisect import bisect_left
+import numpy as np
+
+NGRAM_SIZE = 3
+EXTEND_CHUNK_SIZE = 64
+
+
+def build_search_text(name, tags=None):
+    parts = [name]
+    if tags:
+        parts.extend(tags.values())
+    return " ".join(parts).casefold()
+
+
+def get_ngrams(text):
+    return {text[start:start + size] for size in range(1, NGRAM_SIZE + 1) for start in range(len(text) - size + 1)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.__texts = []
+        self.__postings = {}
+        self.__last_words = None
+        self.__last_results = None
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__texts)
+
+    def clear(self):
+        with self.__lock:
+            self.__texts = []
+            self.__postings = {}
+            self.__last_words = None
+
+    def extend(self, texts):
+        for start in range(0, len(texts), EXTEND_CHUNK_SIZE):
+            chunk = [(text, get_ngrams(text)) for text in texts[start:start + EXTEND_CHUNK_SIZE]]
+            with self.__lock:
+                for index, (text, ngrams) in enumerate(chunk, len(self.__texts)):
+                    self.__texts.append(text)
+                    for ngram in ngrams:
+                        posting = self.__postings.get(ngram)
+                        if posting is None:
+                            posting = self.__postings[ngram] = array("I")
+                        posting.append(index)
+                self.__last_words = None
+
+    def update(self, index, text):
+        new_ngrams = get_ngrams(text)
+        with self.__lock:
+            if index >= len(self.__texts):
+                return
+            old_ngrams = get_ngrams(self.__texts[index])
+            self.__texts[index] = text
+
+            for ngram in old_ngrams - new_ngrams:
+                posting = self.__postings[ngram]
+                del posting[bisect_left(posting, index)]
+            for ngram in new_ngrams - old_ngrams:
+                posting = self.__postings.get(ngram)
+                if posting is None:
+                    posting = self.__postings[ngram] = array("I")
+                posting.insert(bisect_left(posting, index), index)
+            self.__last_words = None
+
+    def remove(self, indices):
+        if not indices:
+            return
+        with self.__lock:
+            keep = np.ones(len(self.__texts), dtype=bool)
+            keep[[index for index in indices if index < len(self.__texts)]] = False
+            remap = (np.cumsum(keep) - 1).astype(np.uint32)
+            self.__texts = [text for text, kept in zip(self.__texts, keep.tolist()) if kept]
+
+            for ngram, posting in list(self.__postings.items()):
+                values = np.frombuffer(posting, dtype=np.uint32)
+                values = remap[values[keep[values]]]
+                if len(values):
+                    self.__postings[ngram] = array("I", values.tobytes())
+                else:
+                    del self.__postings[ngram]
+            self.__last_words = None
+
+    def get_candidates(self, words):
+        empty = array("I")
+        ngrams = {word[start:start + NGRAM_SIZE] for word in words for start in range(max(1, len(word) - NGRAM_SIZE + 1))}
+        ngram = min(ngrams, key=lambda ngram: len(self.__postings.get(ngram, empty)))
+        return self.__postings.get(ngram, empty), ngram
+
+    def is_refinement(self, words):
+        return self.__last_words is not None and all(any(old in word for word in words) for old in self.__last_words)
+
+    def search(self, query):
+        words = query.casefold().split()
+        if not words:
+            self.__last_words = None
+            return None
+
+        with self.__lock:
+            return self.find(words)
+
+    def find(self, words):
+        candidates, ngram = self.get_candidates(words)
+        pending = [word for word in words if word != ngram]
+        if self.is_refinement(words) and len(self.__last_results) <= len(candidates):
+            candidates = self.__last_results
+            pending = [word for word in words if not any(word in old for old in self.__last_words)]
+
+        texts = self.__texts
+        for word in sorted(pending, key=len, reverse=True):
+            candidates = [index for index in candidates if word in texts[index]]
+
+        self.__last_words = words
+        self.__last_results = array("I", candidates)
+        return self.__last_results
@@ -0,0 +1,196 @@
+import mmap
+import os
+import struct
+from array import array
+
+MPEG_BITRATES = {1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+                 2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)}
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+DECODER_DELAY = 529
+PREROLL_FRAMES = 2
+
+
+class SeekIndex:
+    def __init__(self, sample_rate, samples_per_entry, offsets, delay=0, exact=True):
+        self.sample_rate = sample_rate
+        self.samples_per_entry = samples_per_entry
+        self.offsets = offsets
+        self.delay = delay
+        self.exact = exact
+
+    def locate(self, position):
+        sample = position * self.sample_rate + self.delay
+        entry = min(int(sample // self.samples_per_entry), len(self.offsets) - 1)
+        if self.exact:
+            entry = max(0, entry - PREROLL_FRAMES)
+        skip_samples = max(0, int(sample - entry * self.samples_per_entry)) if self.exact else 0
+        return self.offsets[entry], skip_samples
+
+    def get_offsets_bytes(self):
+        return self.offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, sample_rate, samples_per_entry, offsets_bytes, delay, exact):
+        offsets = array("I")
+        offsets.frombytes(offsets_bytes)
+        return cls(sample_rate, samples_per_entry, offsets, delay, bool(exact))
+
+
+def parse_frame_header(data, offset):
+    if offset + 4 > len(data):
+        return None
+    header = struct.unpack_from(">I", data, offset)[0]
+    if header & 0xFFE00000 != 0xFFE00000:
+        return None
+
+    version = (header >> 19) & 3
+    layer = (header >> 17) & 3
+    bitrate_index = (header >> 12) & 15
+    sample_rate_index = (header >> 10) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    padding = (header >> 9) & 1
+    mono = (header >> 6) & 3 == 3
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        bitrate = MPEG_BITRATES[1][bitrate_index] * 1000
+        samples_per_frame = 1152
+        side_info_size = 17 if mono else 32
+    else:
+        bitrate = MPEG_BITRATES[2][bitrate_index] * 1000
+        samples_per_frame = 576
+        side_info_size = 9 if mono else 17
+
+    frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return frame_length, sample_rate, samples_per_frame, side_info_size
+
+
+def get_id3v2_size(data):
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_next_frame(data, offset, limit=65536):
+    end = min(len(data) - 4, offset + limit)
+    while offset < end:
+        offset = data.find(b"\xff", offset, end)
+        if offset == -1:
+            return None
+        header = parse_frame_header(data, offset)
+        if header is not None and parse_frame_header(data, offset + header[0]) is not None:
+            return offset
+        offset += 1
+    return None
+
+
+def read_info_frame(data, offset, header):
+    frame_length, sample_rate, samples_per_frame, side_info_size = header
+    xing_offset = offset + 4 + side_info_size
+    tag = bytes(data[xing_offset:xing_offset + 4])
+
+    if tag in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", data, xing_offset + 4)[0]
+        position = xing_offset + 8
+        frames = bytes_count = None
+        toc = None
+        if flags & 1:
+            frames = struct.unpack_from(">I", data, position)[0]
+            position += 4
+        if flags & 2:
+            bytes_count = struct.unpack_from(">I", data, position)[0]
+            position += 4
+        if flags & 4:
+            toc = bytes(data[position:position + 100])
+            position += 100
+        if flags & 8:
+            position += 4
+
+        delay = 0
+        if bytes(data[position:position + 4]) == b"LAME":
+            encoder_delay = (data[position + 21] << 4) | (data[position + 22] >> 4)
+            delay = encoder_delay + DECODER_DELAY
+
+        return {"frames": frames, "bytes": bytes_count, "toc": toc, "delay": delay}
+
+    vbri_offset = offset + 4 + 32
+    if bytes(data[vbri_offset:vbri_offset + 4]) == b"VBRI":
+        delay = struct.unpack_from(">H", data, vbri_offset + 6)[0]
+        bytes_count, frames, entry_count, scale, entry_size, frames_per_entry = \
+            struct.unpack_from(">IIHHHH", data, vbri_offset + 10)
+        position = vbri_offset + 26
+        offsets = array("I")
+        current = offset + frame_length
+        for _ in range(entry_count):
+            offsets.append(current)
+            current += int.from_bytes(data[position:position + entry_size], "big") * scale
+            position += entry_size
+        return {"frames": frames, "bytes": bytes_count, "vbri": (offsets, frames_per_entry * samples_per_frame), "delay": delay}
+
+    return None
+
+
+def build_toc_index(data, first_frame, header, info):
+    _, sample_rate, samples_per_frame, _ = header
+    if "vbri" in info:
+        offsets, samples_per_entry = info["vbri"]
+        return SeekIndex(sample_rate, samples_per_entry, offsets, info["delay"], exact=False)
+
+    if not info.get("toc") or not info.get("frames"):
+        return None
+    audio_bytes = info.get("bytes") or (len(data) - first_frame)
+    offsets = array("I", (first_frame + audio_bytes * entry // 256 for entry in info["toc"]))
+    return SeekIndex(sample_rate, info["frames"] * samples_per_frame / 100, offsets, info["delay"], exact=False)
+
+
+def build_mp3_seek_index(path):
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first_frame = find_next_frame(data, get_id3v2_size(data))
+            if first_frame is None:
+                return None
+
+            header = parse_frame_header(data, first_frame)
+            info = read_info_frame(data, first_frame, header)
+            offset = first_frame
+            delay = 0
+            if info is not None:
+                offset += header[0]
+                delay = info["delay"]
+
+            sample_rate, samples_per_frame = header[1], header[2]
+            offsets = array("I")
+            while True:
+                frame = parse_frame_header(data, offset)
+                if frame is None:
+                    if data[offset:offset + 3] == b"TAG":
+                        break
+                    offset = find_next_frame(data, offset + 1)
+                    if offset is None:
+                        break
+                    continue
+                offsets.append(offset)
+                offset += frame[0]
+
+            if offsets:
+                return SeekIndex(sample_rate, samples_per_frame, offsets, delay)
+            if info is not None:
+                return build_toc_index(data, first_frame, header, info)
+            return None
+
+
+def load_or_build_seek_index(metadata, path):
+    seek_index = metadata.get_seek_index(path)
+    if seek_index is None:
+        stat = os.stat(path)
+        seek_index = build_mp3_seek_index(path)
+        if seek_index is not None:
+            metadata.put_seek_index(path, stat, seek_index)
+    return seek_index
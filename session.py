@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+from tracing import tracer
+
+SESSION_PATH = "session.json"
+SAVE_DELAY = 2.0
+
+
+class SessionStore:
+    def __init__(self, path=SESSION_PATH, delay=SAVE_DELAY):
+        self.__path = path
+        self.__delay = delay
+        self.__state = {}
+        self.__dirty_since = None
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__thread = None
+
+    def load(self):
+        try:
+            with open(self.__path, encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            state = {}
+        with self.__condition:
+            self.__state = state if isinstance(state, dict) else {}
+            return dict(self.__state)
+
+    def get(self, key, default=None):
+        with self.__condition:
+            return self.__state.get(key, default)
+
+    def update(self, **values):
+        with self.__condition:
+            if self.__closed or all(self.__state.get(key) == value for key, value in values.items()):
+                return
+            self.__state.update(values)
+            if self.__dirty_since is None:
+                self.__dirty_since = time.monotonic()
+                self.__condition.notify()
+
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.run, name="session", daemon=True)
+                self.__thread.start()
+
+    def take_dirty_state(self):
+        if self.__dirty_since is None:
+            return None
+        self.__dirty_since = None
+        return json.dumps(self.__state)
+
+    def run(self):
+        while True:
+            with self.__condition:
+                while self.__dirty_since is None and not self.__closed:
+                    self.__condition.wait()
+                while not self.__closed and time.monotonic() < self.__dirty_since + self.__delay:
+                    self.__condition.wait(self.__dirty_since + self.__delay - time.monotonic())
+                if self.__closed:
+                    return
+                data = self.take_dirty_state()
+            self.write(data)
+
+    def write(self, data):
+        temporary_path = f"{self.__path}.tmp"
+        try:
+            with tracer.span("session.write"):
+                with open(temporary_path, "w", encoding="utf-8") as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temporary_path, self.__path)
+        except OSError:
+            pass
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+        with self.__condition:
+            data = self.take_dirty_state()
+        if data is not None:
+            self.write(data)
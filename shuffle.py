@@ -0,0 +1,118 @@
+import base64
+import random
+from array import array
+
+
+def build_permutation(size, seed):
+    order = array("I", range(size))
+    generator = random.Random(seed)
+    for index in range(size - 1, 0, -1):
+        swap_index = generator.randint(0, index)
+        order[index], order[swap_index] = order[swap_index], order[index]
+    return order
+
+
+class ShuffleOrder:
+    def __init__(self):
+        self.__seed = 0
+        self.__order = array("I")
+        self.__next_order = None
+        self.__cursor = 0
+
+    def __len__(self):
+        return len(self.__order)
+
+    def reset(self, size, seed=None, cursor=0, order=None):
+        self.__seed = random.getrandbits(32) if seed is None else seed
+        self.__order = build_permutation(size, self.__seed) if order is None else order
+        self.__next_order = None
+        self.__cursor = min(cursor, max(0, size - 1))
+
+    def restart(self, size, current_index=None):
+        self.reset(size)
+        if current_index is not None and self.__order:
+            self.swap(self.__order.index(current_index), 0)
+
+    def ensure(self, size, current_index=None):
+        if len(self.__order) != size:
+            self.restart(size, current_index)
+        elif current_index is not None and self.__order:
+            self.move_to(current_index)
+
+    def get_seed(self):
+        return self.__seed
+
+    def get_cursor(self):
+        return self.__cursor
+
+    def get_order_text(self):
+        return base64.b64encode(self.__order.tobytes()).decode("ascii")
+
+    def restore(self, size, seed, cursor, order_text):
+        order = array("I")
+        try:
+            order.frombytes(base64.b64decode(order_text))
+        except ValueError:
+            return False
+        if len(order) != size or sorted(order) != list(range(size)):
+            return False
+        self.reset(size, seed, cursor, order)
+        return True
+
+    def current(self):
+        return self.__order[self.__cursor]
+
+    def swap(self, position, other_position):
+        self.__order[position], self.__order[other_position] = self.__order[other_position], self.__order[position]
+
+    def update(self, remap, size):
+        if remap is None:
+            order = self.__order
+            cursor = self.__cursor
+        else:
+            order = array("I", (remap[index] for index in self.__order if remap[index] >= 0))
+            cursor = max(0, sum(1 for index in self.__order[:self.__cursor + 1] if remap[index] >= 0) - 1)
+
+        first_added = len(order)
+        order.extend(range(first_added, size))
+        generator = random.Random(self.__seed ^ size)
+        self.__order = order
+        for position in range(max(first_added, cursor + 1), size):
+            self.swap(position, generator.randint(cursor + 1, position))
+        self.__next_order = None
+        self.__cursor = min(cursor, max(0, size - 1))
+
+    def move_to(self, index):
+        if index == self.__order[self.__cursor]:
+            return
+        position = self.__order.index(index)
+        if position > self.__cursor:
+            self.__cursor += 1
+            self.swap(position, self.__cursor)
+
+    def get_next_cycle(self):
+        if self.__next_order is None:
+            self.__next_order = build_permutation(len(self.__order), (self.__seed + 1) % 2 ** 32)
+        return self.__next_order
+
+    def peek_next(self):
+        if self.__cursor + 1 < len(self.__order):
+            return self.__order[self.__cursor + 1]
+        return self.get_next_cycle()[0]
+
+    def advance(self):
+        if self.__cursor + 1 < len(self.__order):
+            self.__cursor += 1
+        else:
+            self.__order = self.get_next_cycle()
+            self.__seed = (self.__seed + 1) % 2 ** 32
+            self.__next_order = None
+            self.__cursor = 0
+        return self.__order[self.__cursor]
+
+    def peek_previous(self):
+        return self.__order[max(0, self.__cursor - 1)]
+
+    def retreat(self):
+        self.__cursor = max(0, self.__cursor - 1)
+        return self.__order[self.__cursor]
@@ -0,0 +1,371 @@
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+from collections import deque
+import numpy as np
+import pygame
+from playback_clock import PlaybackClock
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def get_mixer_format():
+    frequency, _, channels = pygame.mixer.get_init()
+    return frequency, channels
+
+
+def decode_wave_samples(data, sample_width, channels):
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int32) - 128) << 8
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.int32)
+    elif sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = (raw[:, 0] << 8 | raw[:, 1] << 16 | raw[:, 2] << 24) >> 16
+    else:
+        samples = np.frombuffer(data, dtype="<i4") >> 16
+    return samples.reshape(-1, channels).astype(np.float32)
+
+
+def convert_channels(samples, channels):
+    if samples.shape[1] == channels:
+        return samples
+    if samples.shape[1] == 1:
+        return np.repeat(samples, channels, axis=1)
+    if channels == 1:
+        return samples.mean(axis=1, keepdims=True)
+    return samples[:, :channels]
+
+
+class WavePcmReader:
+    def __init__(self, path, frequency, channels, start=0.0):
+        self.__wave = wave.open(path, "rb")
+        self.__sample_width = self.__wave.getsampwidth()
+        self.__source_channels = self.__wave.getnchannels()
+        self.__source_frequency = self.__wave.getframerate()
+        if self.__sample_width not in (1, 2, 3, 4):
+            self.__wave.close()
+            raise wave.Error(f"unsupported sample width {self.__sample_width}")
+
+        self.__frequency = frequency
+        self.__channels = channels
+        self.__step = self.__source_frequency / frequency
+        self.__offset = 0.0
+        self.__carry = None
+
+        self.__wave.setpos(min(self.__wave.getnframes(), int(start * self.__source_frequency)))
+
+    def read(self, frames):
+        data = self.__wave.readframes(int(frames * self.__step) + 1)
+        if not data:
+            return b""
+
+        samples = convert_channels(decode_wave_samples(data, self.__sample_width, self.__source_channels), self.__channels)
+        if self.__source_frequency != self.__frequency:
+            samples = self.resample(samples)
+        return np.clip(samples, -32768, 32767).astype("<i2").tobytes()
+
+    def resample(self, samples):
+        if self.__carry is not None:
+            samples = np.concatenate((self.__carry, samples))
+        self.__carry = samples[-1:]
+
+        positions = np.arange(self.__offset, len(samples) - 1, self.__step)
+        if len(positions):
+            self.__offset = positions[-1] + self.__step - (len(samples) - 1)
+        else:
+            self.__offset -= len(samples) - 1
+
+        source_positions = np.arange(len(samples))
+        return np.column_stack([np.interp(positions, source_positions, samples[:, channel])
+                                for channel in range(samples.shape[1])])
+
+    def close(self):
+        self.__wave.close()
+
+
+class FfmpegPcmReader:
+    def __init__(self, path, frequency, channels, start=0.0, byte_offset=None, skip_frames=0):
+        creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+        output = ["-f", "s16le", "-ac", str(channels), "-ar", str(frequency), "-"]
+
+        if byte_offset is None:
+            command = [FFMPEG, "-v", "quiet", "-ss", f"{start:.3f}", "-i", path] + output
+            self.__process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                              stderr=subprocess.DEVNULL, creationflags=creationflags)
+        else:
+            command = [FFMPEG, "-v", "quiet", "-f", "mp3", "-i", "pipe:0"] + output
+            with open(path, "rb") as source:
+                source.seek(byte_offset)
+                self.__process = subprocess.Popen(command, stdin=source, stdout=subprocess.PIPE,
+                                                  stderr=subprocess.DEVNULL, creationflags=creationflags)
+
+        self.__frame_size = 2 * channels
+        self.__skip_bytes = skip_frames * self.__frame_size
+
+    def read(self, frames):
+        while self.__skip_bytes:
+            skipped = self.__process.stdout.read(min(self.__skip_bytes, 65536))
+            if not skipped:
+                return b""
+            self.__skip_bytes -= len(skipped)
+
+        size = frames * self.__frame_size
+        data = bytearray()
+        while len(data) < size:
+            block = self.__process.stdout.read(size - len(data))
+            if not block:
+                break
+            data += block
+        return bytes(data[:len(data) - len(data) % self.__frame_size])
+
+    def close(self):
+        if self.__process.poll() is None:
+            self.__process.kill()
+        self.__process.stdout.close()
+        self.__process.wait()
+
+
+def open_pcm_reader(path, start=0.0, seek_index=None):
+    frequency, channels = get_mixer_format()
+    if path.lower().endswith(".wav"):
+        try:
+            return WavePcmReader(path, frequency, channels, start)
+        except (wave.Error, EOFError):
+            pass
+    if not FFMPEG:
+        return None
+
+    if start and seek_index is not None:
+        byte_offset, skip_samples = seek_index.locate(start)
+        skip_frames = int(skip_samples * frequency / seek_index.sample_rate)
+        return FfmpegPcmReader(path, frequency, channels, byte_offset=byte_offset, skip_frames=skip_frames)
+    return FfmpegPcmReader(path, frequency, channels, start)
+
+
+class PcmRingBuffer:
+    def __init__(self, capacity):
+        self.__buffer = bytearray(capacity)
+        self.__capacity = capacity
+        self.__start = 0
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def free(self):
+        return self.__capacity - self.__size
+
+    def write(self, data):
+        end = (self.__start + self.__size) % self.__capacity
+        first = min(len(data), self.__capacity - end)
+        self.__buffer[end:end + first] = data[:first]
+        self.__buffer[:len(data) - first] = data[first:]
+        self.__size += len(data)
+
+    def truncate(self, size):
+        self.__size = min(self.__size, size)
+
+    def read(self, size):
+        size = min(size, self.__size)
+        first = min(size, self.__capacity - self.__start)
+        data = bytes(self.__buffer[self.__start:self.__start + first]) + bytes(self.__buffer[:size - first])
+        self.__start = (self.__start + size) % self.__capacity
+        self.__size -= size
+        return data
+
+
+class EmptyPcmReader:
+    def read(self, frames):
+        return b""
+
+    def close(self):
+        pass
+
+
+class StreamingChannel:
+    def __init__(self, channel, reader, start_position=0.0, chunk_seconds=0.25, buffer_chunks=8):
+        frequency, channels = get_mixer_format()
+        self.__channel = channel
+        self.__reader = reader
+        self.__frequency = frequency
+        self.__frame_size = channels * 2
+        self.__chunk_frames = int(frequency * chunk_seconds)
+        self.__chunk_bytes = self.__chunk_frames * self.__frame_size
+        self.__buffer_bytes = self.__chunk_bytes * buffer_chunks
+        self.__ring = PcmRingBuffer(self.__buffer_bytes + 2 * self.__chunk_bytes)
+        self.__poll_interval = chunk_seconds / 4
+        self.__stopped = threading.Event()
+        self.__lock = threading.Lock()
+        self.__finished = False
+        self.__thread = threading.Thread(target=self.run, daemon=True)
+
+        self.__start_position = start_position
+        self.__played_frames = 0
+        self.__current_frames = 0
+        self.__queued_frames = 0
+        self.__chunk_clock = PlaybackClock()
+        self.__paused = False
+
+        self.__next_reader = None
+        self.__unchain_requested = False
+        self.__written_frames = 0
+        self.__track_boundaries = deque()
+        self.__origin_frames = 0
+        self.__track_count = 0
+        self.__underrun_seconds = 0.0
+
+    def start(self):
+        self.__thread.start()
+
+    def run(self):
+        try:
+            while not self.__stopped.is_set():
+                if self.__unchain_requested:
+                    self.drop_chained_track()
+                exhausted = False
+                while len(self.__ring) < self.__buffer_bytes:
+                    data = self.__reader.read(self.__chunk_frames)
+                    if data:
+                        self.__ring.write(data)
+                        self.__written_frames += len(data) // self.__frame_size
+                    elif not self.switch_to_next_reader():
+                        exhausted = True
+                        break
+
+                if self.__channel.get_queue() is None and len(self.__ring):
+                    data = self.__ring.read(self.__chunk_bytes)
+                    sound = pygame.mixer.Sound(buffer=data)
+                    with self.__lock:
+                        if not self.__stopped.is_set():
+                            self.count_queued_chunk(len(data) // self.__frame_size)
+                            self.__channel.queue(sound)
+                    continue
+
+                if exhausted and not len(self.__ring) and not self.__channel.get_busy():
+                    break
+                self.__stopped.wait(self.__poll_interval)
+        finally:
+            with self.__lock:
+                self.__played_frames += self.__current_frames + self.__queued_frames
+                self.__current_frames = self.__queued_frames = 0
+                self.__finished = True
+                if self.__next_reader is not None:
+                    self.__next_reader.close()
+                    self.__next_reader = None
+            self.__reader.close()
+
+    def chain(self, reader):
+        with self.__lock:
+            if self.__next_reader is not None:
+                self.__next_reader.close()
+            self.__next_reader = reader
+            self.__underrun_seconds = 0.0
+
+    def unchain(self):
+        with self.__lock:
+            if self.__next_reader is not None:
+                self.__next_reader.close()
+                self.__next_reader = None
+            elif self.__track_boundaries:
+                self.__unchain_requested = True
+
+    def drop_chained_track(self):
+        with self.__lock:
+            self.__unchain_requested = False
+            buffered_from = self.__written_frames - len(self.__ring) // self.__frame_size
+            if not self.__track_boundaries or self.__track_boundaries[-1] < buffered_from:
+                return
+            boundary = self.__track_boundaries.pop()
+            self.__ring.truncate((boundary - buffered_from) * self.__frame_size)
+            self.__written_frames = boundary
+
+        self.__reader.close()
+        self.__reader = EmptyPcmReader()
+
+    def switch_to_next_reader(self):
+        with self.__lock:
+            next_reader, self.__next_reader = self.__next_reader, None
+            if next_reader is None:
+                return False
+            self.__track_boundaries.append(self.__written_frames)
+
+        self.__reader.close()
+        self.__reader = next_reader
+        return True
+
+    def get_track_count(self):
+        with self.__lock:
+            self.get_consumed_frames()
+            return self.__track_count
+
+    def get_underrun_seconds(self):
+        return self.__underrun_seconds
+
+    def get_consumed_frames(self):
+        consumed_frames = self.__played_frames
+        if self.__current_frames:
+            consumed_frames += min(self.__current_frames, self.__chunk_clock.get_position() * self.__frequency)
+
+        while self.__track_boundaries and consumed_frames >= self.__track_boundaries[0]:
+            self.__origin_frames = self.__track_boundaries.popleft()
+            self.__start_position = 0.0
+            self.__track_count += 1
+        return consumed_frames
+
+    def count_queued_chunk(self, frames):
+        if self.__queued_frames:
+            overshoot = self.__chunk_clock.get_position() - self.__current_frames / self.__frequency
+            self.__played_frames += self.__current_frames
+            self.__current_frames = self.__queued_frames
+            self.__queued_frames = 0
+            self.start_chunk_clock(overshoot if 0 < overshoot < self.__poll_interval * 2 else 0.0)
+
+        if self.__channel.get_busy():
+            self.__queued_frames = frames
+        else:
+            if self.__current_frames and not self.__paused:
+                overshoot = self.__chunk_clock.get_position() - self.__current_frames / self.__frequency
+                self.__underrun_seconds = max(self.__underrun_seconds, overshoot)
+            self.__played_frames += self.__current_frames
+            self.__current_frames = frames
+            self.start_chunk_clock(0.0)
+        self.get_consumed_frames()
+
+    def start_chunk_clock(self, position):
+        self.__chunk_clock.start(position)
+        if self.__paused:
+            self.__chunk_clock.pause()
+
+    def get_position(self):
+        with self.__lock:
+            consumed_frames = self.get_consumed_frames()
+            return self.__start_position + (consumed_frames - self.__origin_frames) / self.__frequency
+
+    def get_busy(self):
+        return not self.__finished
+
+    def pause(self):
+        with self.__lock:
+            self.__paused = True
+            self.__channel.pause()
+            self.__chunk_clock.pause()
+
+    def unpause(self):
+        with self.__lock:
+            self.__paused = False
+            self.__channel.unpause()
+            self.__chunk_clock.resume()
+
+    def set_volume(self, volume):
+        self.__channel.set_volume(volume)
+
+    def get_volume(self):
+        return self.__channel.get_volume()
+
+    def stop(self):
+        with self.__lock:
+            self.__stopped.set()
+            self.__channel.stop()
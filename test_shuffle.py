@@ -0,0 +1,70 @@
+import unittest
+from shuffle import ShuffleOrder
+
+SIZE = 10
+
+
+class ShuffleOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.order = ShuffleOrder()
+        self.order.reset(SIZE, seed=1)
+        self.played = [self.order.peek_previous()]
+
+    def advance(self, count):
+        for _ in range(count):
+            self.played.append(self.order.advance())
+
+    def test_cycle_plays_every_track_once(self):
+        self.advance(SIZE - 1)
+        self.assertEqual(sorted(self.played), list(range(SIZE)))
+
+    def test_previous_at_cycle_start_keeps_the_cycle(self):
+        self.assertEqual(self.order.retreat(), self.played[0])
+        self.advance(SIZE - 1)
+        self.assertEqual(sorted(self.played), list(range(SIZE)))
+
+    def test_previous_then_next_replays_without_skipping(self):
+        self.advance(3)
+        self.order.retreat()
+        self.assertEqual(self.order.advance(), self.played[-1])
+        self.advance(SIZE - 4)
+        self.assertEqual(sorted(self.played), list(range(SIZE)))
+
+    def test_move_to_keeps_unplayed_tracks(self):
+        self.advance(2)
+        unplayed = [index for index in range(SIZE) if index not in self.played]
+        self.order.move_to(unplayed[-1])
+        self.played.append(unplayed[-1])
+        self.order.move_to(self.played[0])
+        self.advance(SIZE - len(self.played))
+        self.assertEqual(sorted(self.played), list(range(SIZE)))
+
+    def test_wrap_starts_a_full_cycle(self):
+        self.advance(SIZE - 1)
+        cycle = [self.order.advance() for _ in range(SIZE)]
+        self.assertEqual(sorted(cycle), list(range(SIZE)))
+
+    def test_library_diff_keeps_played_tracks_and_adds_new_ones(self):
+        self.advance(4)
+        removed = {self.played[1], self.order.peek_next()}
+        remap = []
+        for index in range(SIZE):
+            remap.append(-1 if index in removed else index - sum(1 for other in removed if other < index))
+        self.order.update(remap, SIZE - len(removed) + 3)
+
+        played = [remap[index] for index in self.played if remap[index] >= 0]
+        self.assertEqual(self.order.current(), played[-1])
+        self.advance(len(self.order) - len(played))
+        self.assertEqual(sorted(played + self.played[5:]), list(range(len(self.order))))
+
+    def test_saved_order_restores_after_a_diff(self):
+        self.advance(3)
+        self.order.update(None, SIZE + 5)
+        restored = ShuffleOrder()
+        self.assertTrue(restored.restore(len(self.order), self.order.get_seed(), self.order.get_cursor(),
+                                         self.order.get_order_text()))
+        self.assertEqual([restored.advance() for _ in range(SIZE + 5)], [self.order.advance() for _ in range(SIZE + 5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+TRACE_ENV = "PLAYDITOR_TRACE"
+DEFAULT_TRACE_PATH = "trace.json"
+MAX_EVENTS = 200000
+SUMMARY_WINDOW = 1000
+
+NULL_SPAN = nullcontext()
+
+
+def get_percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Span:
+    def __init__(self, tracer, name, args):
+        self.__tracer = tracer
+        self.__name = name
+        self.__args = args
+        self.__started = None
+
+    def __enter__(self):
+        self.__started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__tracer.add_span(self.__name, self.__started, time.perf_counter(), self.__args)
+        return False
+
+
+class Tracer:
+    def __init__(self):
+        self.__enabled = False
+        self.__path = None
+        self.__origin = time.perf_counter()
+        self.__events = deque(maxlen=MAX_EVENTS)
+        self.__windows = {}
+        self.__counts = {}
+        self.__thread_names = {}
+        self.__lock = threading.Lock()
+
+    def enable(self, path=None):
+        self.__enabled = True
+        self.__path = path
+
+    def is_enabled(self):
+        return self.__enabled
+
+    def span(self, name, **args):
+        if not self.__enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def add_span(self, name, started, finished, args=None):
+        if self.__enabled:
+            self.record("X", name, started, finished - started, args)
+
+    def add_value(self, name, value, args=None):
+        if self.__enabled:
+            self.record("C", name, time.perf_counter(), value, args)
+
+    def record(self, phase, name, timestamp, value, args):
+        thread = threading.current_thread()
+        with self.__lock:
+            self.__events.append((phase, name, timestamp, value, thread.ident, args))
+            self.__thread_names.setdefault(thread.ident, thread.name)
+
+            window = self.__windows.get(name)
+            if window is None:
+                window = self.__windows[name] = deque(maxlen=SUMMARY_WINDOW)
+            window.append(value)
+            self.__counts[name] = self.__counts.get(name, 0) + 1
+
+    def get_summary(self):
+        with self.__lock:
+            windows = {name: sorted(window) for name, window in self.__windows.items()}
+            counts = dict(self.__counts)
+
+        return {name: {"count": counts[name],
+                       "p50_ms": get_percentile(values, 0.5) * 1000,
+                       "p99_ms": get_percentile(values, 0.99) * 1000,
+                       "max_ms": values[-1] * 1000}
+                for name, values in sorted(windows.items())}
+
+    def format_summary(self):
+        lines = [f"{'span':<28}{'count':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, row in self.get_summary().items():
+            lines.append(f"{name:<28}{row['count']:>9}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+        return "\n".join(lines)
+
+    def get_trace_events(self):
+        with self.__lock:
+            events = list(self.__events)
+            thread_names = dict(self.__thread_names)
+
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                        for tid, name in thread_names.items()]
+        for phase, name, timestamp, value, tid, args in events:
+            event = {"name": name, "ph": phase, "pid": pid, "tid": tid, "ts": (timestamp - self.__origin) * 1e6}
+            if phase == "X":
+                event["dur"] = value * 1e6
+                if args:
+                    event["args"] = args
+            else:
+                event["args"] = {"ms": value * 1000}
+            trace_events.append(event)
+        return trace_events
+
+    def write_trace(self, path=None):
+        path = path or self.__path
+        if not path:
+            return None
+
+        trace = {"traceEvents": self.get_trace_events(),
+                 "displayTimeUnit": "ms",
+                 "otherData": {"summary": self.get_summary()}}
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(trace, file)
+        os.replace(temporary_path, path)
+        return path
+
+    def finish(self):
+        if not self.__enabled:
+            return
+        print(self.format_summary(), file=sys.stderr)
+        path = self.write_trace()
+        if path:
+            print(f"Trace written to {path}", file=sys.stderr)
+
+
+tracer = Tracer()
+
+
+def configure_tracing(path=None):
+    path = path or os.environ.get(TRACE_ENV)
+    if not path or path == "0":
+        return False
+    tracer.enable(DEFAULT_TRACE_PATH if path == "1" else path)
+    return True
@@ -0,0 +1,205 @@
+import tkinter as tk
+from bisect import bisect_left
+from tkinter import font
+
+
+class VirtualListbox(tk.Canvas):
+    def __init__(self, master, items=None, foreground="light gray", stripe_colors=("#072a47", "#012440"),
+                 select_background="#2f6ea5", **kwargs):
+        self.__yscrollcommand = kwargs.pop("yscrollcommand", None)
+        kwargs.setdefault("highlightthickness", 0)
+        super().__init__(master, **kwargs)
+
+        self.__items = items if items is not None else []
+        self.__filter = None
+        self.__foreground = foreground
+        self.__stripe_colors = stripe_colors
+        self.__select_background = select_background
+        self.__font = font.nametofont("TkDefaultFont")
+        self.__row_height = self.__font.metrics("linespace") + 4
+
+        self.__top = 0
+        self.__selected = None
+        self.__rows = []
+        self.__drawn = []
+        self.__width = 0
+        self.__last_scroll = None
+
+        self.bind("<Configure>", self.on_configure)
+        self.bind("<Button-1>", self.on_click)
+        self.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.bind("<Button-4>", lambda event: self.scroll_to(self.__top - 3))
+        self.bind("<Button-5>", lambda event: self.scroll_to(self.__top + 3))
+
+    def configure(self, cnf=None, **kwargs):
+        if "yscrollcommand" in kwargs:
+            self.__yscrollcommand = kwargs.pop("yscrollcommand")
+            self.update_scrollbar()
+        if cnf is None and not kwargs:
+            return super().configure()
+        return super().configure(cnf, **kwargs)
+
+    config = configure
+
+    def set_items(self, items):
+        self.__items = items
+        self.__filter = None
+        self.__top = 0
+        self.__selected = None
+        self.refresh()
+
+    def set_filter(self, indices):
+        self.__filter = indices
+        self.__top = 0
+        self.refresh()
+
+    def remap(self, remap):
+        if remap is not None:
+            if self.__filter is not None:
+                self.__filter = [remap[index] for index in self.__filter if remap[index] >= 0]
+            if self.__selected is not None:
+                self.__selected = remap[self.__selected] if remap[self.__selected] >= 0 else None
+        self.__top = max(0, min(self.__top, self.get_row_count() - 1))
+        self.refresh()
+
+    def refresh(self):
+        self.__drawn = [None] * len(self.__rows)
+        self.scroll_to(self.__top)
+
+    def size(self):
+        return self.get_row_count()
+
+    def get_row_count(self):
+        if self.__filter is None:
+            return len(self.__items)
+        return len(self.__filter)
+
+    def get_item_index(self, row):
+        if self.__filter is None:
+            return row
+        return self.__filter[row]
+
+    def get_row(self, index):
+        if self.__filter is None:
+            return index
+        row = bisect_left(self.__filter, index)
+        if row < len(self.__filter) and self.__filter[row] == index:
+            return row
+        return None
+
+    def get_visible_rows(self):
+        return max(1, self.winfo_height() // self.__row_height)
+
+    def curselection(self):
+        if self.__selected is None:
+            return ()
+        return (self.__selected,)
+
+    def select_set(self, index):
+        if 0 <= index < len(self.__items):
+            self.__selected = index
+            self.redraw()
+
+    def selection_clear(self, first=0, last=None):
+        self.__selected = None
+        self.redraw()
+
+    def see(self, index):
+        row = self.get_row(index)
+        if row is None:
+            return
+
+        visible_rows = self.get_visible_rows()
+        if row < self.__top:
+            self.scroll_to(row)
+        elif row >= self.__top + visible_rows:
+            self.scroll_to(row - visible_rows + 1)
+
+    def yview(self, *args):
+        if not args:
+            return self.get_scroll_fractions()
+
+        if args[0] == "moveto":
+            self.yview_moveto(float(args[1]))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= max(1, self.get_visible_rows() - 1)
+            self.scroll_to(self.__top + amount)
+
+    def yview_moveto(self, fraction):
+        self.scroll_to(int(round(fraction * self.get_row_count())))
+
+    def yview_scroll(self, number, what):
+        self.yview("scroll", number, what)
+
+    def scroll_to(self, top):
+        self.__top = max(0, min(top, self.get_row_count() - self.get_visible_rows()))
+        self.redraw()
+        self.update_scrollbar()
+
+    def get_scroll_fractions(self):
+        row_count = self.get_row_count()
+        if not row_count:
+            return 0.0, 1.0
+        first = self.__top / row_count
+        last = min(1.0, (self.__top + self.get_visible_rows()) / row_count)
+        return first, last
+
+    def update_scrollbar(self):
+        fractions = self.get_scroll_fractions()
+        if self.__yscrollcommand and fractions != self.__last_scroll:
+            self.__last_scroll = fractions
+            self.__yscrollcommand(*fractions)
+
+    def on_configure(self, event):
+        self.__width = event.width
+        row_count = event.height // self.__row_height + 1
+
+        while len(self.__rows) < row_count:
+            slot = len(self.__rows)
+            y = slot * self.__row_height
+            rectangle = self.create_rectangle(0, y, 0, y + self.__row_height, width=0)
+            text = self.create_text(4, y + self.__row_height // 2, anchor=tk.W, font=self.__font, fill=self.__foreground)
+            self.__rows.append((rectangle, text))
+            self.__drawn.append(None)
+
+        for slot, (rectangle, _) in enumerate(self.__rows):
+            y = slot * self.__row_height
+            self.coords(rectangle, 0, y, self.__width, y + self.__row_height)
+
+        self.scroll_to(self.__top)
+
+    def redraw(self):
+        row_count = self.get_row_count()
+        for slot, (rectangle, text) in enumerate(self.__rows):
+            row = self.__top + slot
+            if row < row_count:
+                index = self.get_item_index(row)
+                if index == self.__selected:
+                    background = self.__select_background
+                else:
+                    background = self.__stripe_colors[row % 2]
+                state = (self.__items[index], background)
+            else:
+                state = None
+
+            if state == self.__drawn[slot]:
+                continue
+            self.__drawn[slot] = state
+
+            if state is None:
+                self.itemconfigure(rectangle, state=tk.HIDDEN)
+                self.itemconfigure(text, state=tk.HIDDEN)
+            else:
+                self.itemconfigure(rectangle, fill=state[1], state=tk.NORMAL)
+                self.itemconfigure(text, text=state[0], state=tk.NORMAL)
+
+    def on_click(self, event):
+        row = self.__top + event.y // self.__row_height
+        if row < self.get_row_count():
+            self.select_set(self.get_item_index(row))
+            self.event_generate("<<ListboxSelect>>")
+
+    def on_mouse_wheel(self, event):
+        self.scroll_to(self.__top + (-3 if event.delta > 0 else 3))
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import deque
+from tracing import tracer
+
+MONITOR_INTERVAL = 0.001
+RAMP_INTERVAL = 0.01
+
+
+class TransitionScheduler:
+    def __init__(self, crossfade_seconds=0.0, history_size=200):
+        self.__crossfade_seconds = crossfade_seconds
+        self.__gaps = deque(maxlen=history_size)
+        self.__lock = threading.Lock()
+        self.__cancelled = threading.Event()
+        self.__thread = None
+        self.__scheduled = None
+        self.__started = None
+
+    def get_crossfade(self):
+        return self.__crossfade_seconds
+
+    def is_scheduled(self):
+        return self.__scheduled is not None
+
+    def cancel(self):
+        self.__cancelled.set()
+        with self.__lock:
+            started, self.__started = self.__started, None
+            self.__scheduled = None
+        return started
+
+    def pop_started(self):
+        with self.__lock:
+            started, self.__started = self.__started, None
+            if started is not None:
+                self.__scheduled = None
+            return started
+
+    def record_gap(self, seconds):
+        seconds = max(0.0, seconds)
+        self.__gaps.append(seconds)
+        tracer.add_value("track.gap", seconds)
+
+    def get_gap_timings(self):
+        return list(self.__gaps)
+
+    def start_thread(self, scheduled, target, *args):
+        self.__cancelled.set()
+        self.__cancelled = threading.Event()
+        self.__scheduled = scheduled
+        self.__thread = threading.Thread(target=target, args=args + (self.__cancelled,), daemon=True)
+        self.__thread.start()
+
+    def mark_started(self, channel, cancelled):
+        with self.__lock:
+            if cancelled.is_set():
+                return False
+            self.__started = (self.__scheduled, channel, time.perf_counter())
+            return True
+
+    def schedule_gapless(self, scheduled, channel, sound, get_remaining):
+        ends_at = time.perf_counter() + get_remaining()
+        channel.queue(sound)
+        self.start_thread(scheduled, self.monitor_queue, channel, ends_at)
+
+    def monitor_queue(self, channel, ends_at, cancelled):
+        while not cancelled.is_set():
+            if channel.get_queue() is None:
+                if self.mark_started(channel, cancelled):
+                    self.record_gap(time.perf_counter() - ends_at)
+                return
+            cancelled.wait(MONITOR_INTERVAL)
+
+    def schedule_stream(self, scheduled, stream, reader):
+        stream.chain(reader)
+        self.start_thread(scheduled, self.monitor_stream, stream, stream.get_track_count())
+
+    def monitor_stream(self, stream, track_count, cancelled):
+        while not cancelled.is_set():
+            if stream.get_track_count() > track_count:
+                self.record_gap(stream.get_underrun_seconds())
+                self.mark_started(stream, cancelled)
+                return
+            cancelled.wait(MONITOR_INTERVAL * 10)
+
+    def schedule_crossfade(self, scheduled, current, upcoming, start_upcoming, get_remaining, volume, release=None):
+        self.start_thread(scheduled, self.crossfade, current, upcoming, start_upcoming, get_remaining, volume, release)
+
+    def crossfade(self, current, upcoming, start_upcoming, get_remaining, volume, release, cancelled):
+        while not cancelled.is_set():
+            wait = get_remaining() - self.__crossfade_seconds
+            if wait <= 0:
+                break
+            cancelled.wait(min(0.05, max(MONITOR_INTERVAL, wait)))
+        if cancelled.is_set():
+            if release is not None:
+                release()
+            return
+
+        late = -wait
+        upcoming.set_volume(0)
+        start_upcoming()
+        if not self.mark_started(upcoming, cancelled):
+            upcoming.stop()
+            return
+        self.record_gap(0.0 if late < self.__crossfade_seconds else late - self.__crossfade_seconds)
+
+        current_volume = current.get_volume()
+        fade_length = max(RAMP_INTERVAL, self.__crossfade_seconds - max(0.0, late))
+        fade_began = time.perf_counter()
+        while not cancelled.is_set():
+            progress = min(1.0, (time.perf_counter() - fade_began) / fade_length)
+            upcoming.set_volume(volume * progress)
+            current.set_volume(current_volume * (1 - progress))
+            if progress >= 1.0:
+                break
+            time.sleep(RAMP_INTERVAL)
+
+        current.stop()
+        current.set_volume(current_volume)
+        upcoming.set_volume(volume)
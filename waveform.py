@@ -0,0 +1,209 @@
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pygame
+from decoding import init_decode_process
+from scanner import walk_audio_files
+from streaming import open_pcm_reader
+from tracing import tracer
+
+PEAKS_DIR = "peaks"
+PEAK_BLOCK_FRAMES = 512
+PEAK_COLUMNS = 2048
+READ_BLOCKS = 256
+
+
+def get_peak_directory(path, peaks_dir=PEAKS_DIR):
+    return os.path.join(peaks_dir, hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest())
+
+
+def get_peak_path(path, stat, peaks_dir=PEAKS_DIR):
+    key = f"{stat.st_size}|{stat.st_mtime_ns}|{PEAK_COLUMNS}"
+    return os.path.join(get_peak_directory(path, peaks_dir), hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+
+def reduce_peaks(samples, channels):
+    block_size = PEAK_BLOCK_FRAMES * channels
+    usable = len(samples) - len(samples) % channels
+    if not usable:
+        return np.empty((0, 2), dtype=np.int16)
+
+    full = usable - usable % block_size
+    peaks = []
+    if full:
+        blocks = samples[:full].reshape(-1, block_size)
+        peaks.append(np.column_stack((blocks.min(axis=1), blocks.max(axis=1))))
+    if full < usable:
+        tail = samples[full:usable]
+        peaks.append(np.array([[tail.min(), tail.max()]], dtype=np.int16))
+    return np.concatenate(peaks).astype(np.int16)
+
+
+def fit_peaks(peaks, columns=PEAK_COLUMNS):
+    lows, highs = get_peak_columns(peaks, columns)
+    if lows is None:
+        return np.empty((0, 2), dtype=np.int16)
+    return np.column_stack((lows, highs))
+
+
+def compute_sound_peaks(sound):
+    channels = pygame.mixer.get_init()[2]
+    return fit_peaks(reduce_peaks(np.frombuffer(memoryview(sound).cast("B"), dtype=np.int16), channels))
+
+
+def compute_reader_peaks(reader):
+    channels = pygame.mixer.get_init()[2]
+    peaks = []
+    try:
+        while True:
+            data = reader.read(PEAK_BLOCK_FRAMES * READ_BLOCKS)
+            if not data:
+                break
+            peaks.append(reduce_peaks(np.frombuffer(data, dtype=np.int16), channels))
+    finally:
+        reader.close()
+    if not peaks:
+        return np.empty((0, 2), dtype=np.int16)
+    return fit_peaks(np.concatenate(peaks))
+
+
+def open_peaks(peak_path):
+    peaks = np.load(peak_path, mmap_mode="r")
+    os.utime(peak_path)
+    return peaks
+
+
+def load_peaks(path, peaks_dir=PEAKS_DIR):
+    try:
+        return open_peaks(get_peak_path(path, os.stat(path), peaks_dir))
+    except (OSError, ValueError):
+        return None
+
+
+def save_peaks(peak_path, peaks):
+    directory = os.path.dirname(peak_path)
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{peak_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.save(file, peaks)
+    os.replace(temporary_path, peak_path)
+
+    with os.scandir(directory) as iterator:
+        stale = [entry.path for entry in iterator if entry.path != peak_path and entry.name.endswith(".npy")]
+    for stale_path in stale:
+        try:
+            os.remove(stale_path)
+        except OSError:
+            pass
+
+
+def load_or_build_peaks(path, sound=None, peaks_dir=PEAKS_DIR):
+    stat = os.stat(path)
+    peak_path = get_peak_path(path, stat, peaks_dir)
+    try:
+        return open_peaks(peak_path)
+    except (OSError, ValueError):
+        pass
+
+    with tracer.span("waveform.peaks", path=path):
+        if sound is None:
+            reader = open_pcm_reader(path)
+            if reader is None:
+                sound = pygame.mixer.Sound(path)
+        peaks = compute_sound_peaks(sound) if sound is not None else compute_reader_peaks(reader)
+
+    save_peaks(peak_path, peaks)
+    return np.load(peak_path, mmap_mode="r")
+
+
+def remove_peaks(path, peaks_dir=PEAKS_DIR):
+    directory = get_peak_directory(path, peaks_dir)
+    try:
+        with os.scandir(directory) as iterator:
+            names = [entry.name for entry in iterator]
+        for name in names:
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    except OSError:
+        pass
+
+
+def prune_peaks(max_bytes, peaks_dir=PEAKS_DIR):
+    entries = []
+    total_bytes = 0
+    try:
+        with os.scandir(peaks_dir) as iterator:
+            directories = [entry.path for entry in iterator if entry.is_dir()]
+    except OSError:
+        return 0
+
+    for directory in directories:
+        try:
+            with os.scandir(directory) as iterator:
+                for entry in iterator:
+                    stat = entry.stat()
+                    if entry.name.endswith(".tmp"):
+                        os.remove(entry.path)
+                    else:
+                        entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+                        total_bytes += stat.st_size
+        except OSError:
+            continue
+
+    removed = 0
+    for _, peak_path, size in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(peak_path)
+        except OSError:
+            continue
+        total_bytes -= size
+        removed += 1
+
+    for directory in directories:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+    return removed
+
+
+def get_peak_columns(peaks, columns):
+    columns = min(columns, len(peaks))
+    if columns <= 0:
+        return None, None
+    edges = np.arange(columns) * len(peaks) // columns
+    return np.minimum.reduceat(peaks[:, 0], edges), np.maximum.reduceat(peaks[:, 1], edges)
+
+
+def build_peak_file(path):
+    try:
+        load_or_build_peaks(path)
+        return path, True
+    except (OSError, pygame.error, EOFError):
+        return path, False
+
+
+def precompute_directory(directory, max_workers=None):
+    paths = [path for path, _ in walk_audio_files(directory)]
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_decode_process) as executor:
+        for done, (path, built) in enumerate(executor.map(build_peak_file, paths, chunksize=4), start=1):
+            if not built:
+                failed.append(path)
+            print(f"\rPeaks... {done}/{len(paths)}", end="", flush=True)
+    print()
+    return len(paths), failed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(f"usage: {sys.argv[0]} DIRECTORY")
+
+    total, failed = precompute_directory(sys.argv[1])
+    for path in failed:
+        print(f"Could not decode {path}", file=sys.stderr)
+    print(f"{total - len(failed)}/{total} tracks analyzed")